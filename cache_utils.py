@@ -0,0 +1,156 @@
+from collections.abc import Callable
+import hashlib
+import os
+import pickle
+import pandas as pd
+
+# Disk cache for the results of cleaning steps. Entries are addressed by a hash of the
+# input data and the operation with its arguments, so a changed input or argument gives
+# a new key and stale entries are never read; they are removed by LRU eviction once the
+# cache is larger than its size limit.
+
+
+def fingerprint(data: pd.DataFrame | pd.Series) -> str:
+    '''
+    This function returns a hash of a dataframe's values, index, column names and data types.
+
+    Parameters:
+        data: The dataframe or series.
+
+    Returns:
+        str: The hash as a hex string.
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(zip(data.columns, data.dtypes.astype(str)))).encode())
+    else:
+        digest.update(repr((data.name, str(data.dtype))).encode())
+    return digest.hexdigest()
+
+
+class StepCache:
+    '''
+    Size-bounded LRU cache of dataframes on disk. Results are stored as Parquet files
+    (with their index and data types) and any fitted state alongside as a pickle.
+
+    Example:
+        cache = StepCache('.step_cache', max_bytes=2 * 1024**3)
+        imputed = cache.cached(transform.impute_median, df, ['int_rate', 'funded_amount'])
+    '''
+
+    def __init__(self, directory: str='.step_cache', max_bytes: int=2 * 1024**3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *parts) -> str:
+        '''
+        Returns a cache key built from the reprs of parts, e.g. an input fingerprint,
+        an operation name and its arguments.
+        '''
+        return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    def __path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f'{key}.{extension}')
+
+    def contains(self, key: str) -> bool:
+        '''Returns True if a result is cached for key.'''
+        return os.path.exists(self.__path(key, 'parquet'))
+
+    def get(self, key: str) -> tuple[pd.DataFrame | pd.Series, object] | None:
+        '''
+        Returns the cached result and fitted state for a key, or None if it is not cached.
+
+        Parameters:
+            key: The cache key.
+        '''
+        path = self.__path(key, 'parquet')
+        if not os.path.exists(path):
+            return None
+        result = pd.read_parquet(path, engine='pyarrow')
+        if result.columns.tolist() == ['__series__']:
+            result = result['__series__'].rename(result.attrs.get('series_name'))
+        # mark as recently used for eviction
+        os.utime(path)
+        return result, self.get_state(key)
+
+    def get_state(self, key: str) -> object:
+        '''
+        Returns only the fitted state stored for a key, or None.
+
+        Parameters:
+            key: The cache key.
+        '''
+        path = self.__path(key, 'pkl')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def put(self, key: str, result: pd.DataFrame | pd.Series, state: object=None) -> None:
+        '''
+        Stores a result and optional fitted state, then evicts the least recently used
+        entries if the cache is over max_bytes.
+
+        Parameters:
+            key: The cache key.
+            result: The dataframe or series to store.
+            state: Any picklable object, e.g. a fitted Imputer. Default = None.
+        '''
+        if isinstance(result, pd.Series):
+            name = result.name
+            result = result.to_frame('__series__')
+            result.attrs['series_name'] = name
+        result.to_parquet(self.__path(key, 'parquet'), engine='pyarrow', index=True)
+        if state is not None:
+            with open(self.__path(key, 'pkl'), 'wb') as file:
+                pickle.dump(state, file)
+        self.evict()
+
+    def evict(self) -> None:
+        '''Removes least recently used entries until the cache is within max_bytes.'''
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.parquet'):
+                path = os.path.join(self.directory, name)
+                state_path = path[:-len('.parquet')] + '.pkl'
+                size = os.path.getsize(path) + (os.path.getsize(state_path) if os.path.exists(state_path) else 0)
+                entries.append((os.path.getmtime(path), size, path, state_path))
+
+        total = sum(entry[1] for entry in entries)
+        for _, size, path, state_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            total -= size
+
+    def clear(self) -> None:
+        '''Removes every entry.'''
+        for name in os.listdir(self.directory):
+            if name.endswith(('.parquet', '.pkl')):
+                os.remove(os.path.join(self.directory, name))
+
+    def cached(self, method: Callable, dataframe: pd.DataFrame, *args, **kwargs) -> pd.DataFrame | pd.Series:
+        '''
+        Calls a DataFrameTransform or DataTransform method, or any function taking a
+        dataframe first, returning the cached result if the same call was made on the
+        same data before.
+
+        Parameters:
+            method: The method, e.g. DataFrameTransform().impute_median.
+            dataframe: The dataframe passed as the first argument.
+            args, kwargs: The other arguments.
+
+        Returns:
+            The (cached) result of method(dataframe, *args, **kwargs).
+        '''
+        key = self.key(fingerprint(dataframe), method.__qualname__, args, sorted(kwargs.items()))
+        hit = self.get(key)
+        if hit is not None:
+            return hit[0]
+        result = method(dataframe, *args, **kwargs)
+        self.put(key, result)
+        return result
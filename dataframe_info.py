@@ -1,8 +1,14 @@
+from cache_utils import fingerprint
+from stream_stats import DataFrameAccumulator
 import pandas as pd
 import numpy as np
 
 class DataFrameInfo:
 
+    def __init__(self):
+        # profiles keyed by a hash of the profiled dataframe's contents, see get_profile
+        self.__profiles = {}
+
     def get_stats(self, dataframe: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
         '''
         This method prints out the statistics of the dataframe
@@ -144,6 +150,21 @@ class DataFrameInfo:
         print(f'The shape of the dataframe is {shape}.')
     
 
+    def get_bytes_per_row(self, dataframe: pd.DataFrame) -> float:
+        '''
+        This method computes the average memory used by one row of a dataframe,
+        including the contents of object/string columns.
+        
+        Parameters:
+            dataframe: The required dataframe.
+        
+        Returns:
+            The number of bytes per row.
+        
+        '''
+        total_bytes = dataframe.memory_usage(deep=True).sum()
+        return total_bytes / max(len(dataframe), 1)
+
     def null_count(self, dataframe: pd.Series | pd.DataFrame, info: bool=True) -> int | pd.Series:
         '''
         This method computes the null counts in a dataframe.
@@ -221,3 +242,101 @@ class DataFrameInfo:
                     numeric_columns.remove(name)
                     
         return numeric_columns
+
+    def get_stats_chunked(self, csv_file: str, chunksize: int=100000, **read_csv_kwargs) -> DataFrameAccumulator:
+        '''
+        This method computes statistics of a csv file by reading it in chunks, so the
+        file does not have to fit in memory. The returned accumulator gives the same
+        reports as get_stats (get_stats, with approximate quantiles) and null_counts,
+        and can be merged with accumulators of other files or partitions.
+        
+        Parameters:
+            csv_file: The csv file.
+            chunksize: The number of rows read at a time. Default = 100000.
+            read_csv_kwargs: Other arguments passed to pandas.read_csv, e.g. dtype or usecols.
+        
+        Returns:
+            The accumulator holding the statistics.
+        
+        '''
+        accumulator = DataFrameAccumulator()
+        for chunk in pd.read_csv(csv_file, chunksize=chunksize, **read_csv_kwargs):
+            accumulator.update(chunk)
+        return accumulator
+
+    def get_profile(self, dataframe: pd.DataFrame, quantiles: tuple[float, ...]=(0.25, 0.5, 0.75),
+                    top: int=1, refresh: bool=False) -> pd.DataFrame:
+        '''
+        This method profiles every column of a dataframe in a single pass per column,
+        giving the count, null count, mean, standard deviation, variance, min, max,
+        quantiles, distinct count and most frequent value(s). Numeric columns are sorted
+        once and every statistic is read from the sorted values, other columns are
+        profiled from one value count.
+
+        The profile is cached under a hash of the dataframe's values, index, column names
+        and data types, so profiling unchanged data again only costs the hash, and any
+        change to the data, including in place, gives a new profile.
+
+        Parameters:
+            dataframe: The required dataframe.
+            quantiles: The quantiles to compute. The median is the 0.5 quantile. 
+            Default = (0.25, 0.5, 0.75).
+            top: Number of most frequent values to list. Default = 1.
+            refresh: If True the profile is recomputed. Default = False.
+
+        Returns:
+            A dataframe with one row per column of the given dataframe.
+
+        '''
+        key = (fingerprint(dataframe), tuple(quantiles), top)
+        if key in self.__profiles and not refresh:
+            return self.__profiles[key]
+
+        profile = pd.DataFrame([self.__profile_column(dataframe[column], quantiles, top) for column in dataframe.columns],
+                               index=dataframe.columns)
+
+        # keep the profiles of the most recently profiled dataframes only
+        self.__profiles.pop(key, None)
+        while len(self.__profiles) >= 8:
+            self.__profiles.pop(next(iter(self.__profiles)))
+        self.__profiles[key] = profile
+        return profile
+
+    def __profile_column(self, values: pd.Series, quantiles: tuple[float, ...], top: int) -> dict:
+        '''Returns the statistics of one column, see get_profile.'''
+        stats = {'count': 0, 'null_count': 0, 'mean': np.nan, 'std': np.nan, 'var': np.nan,
+                 'min': np.nan, 'max': np.nan}
+        stats.update({f'q{q:g}': np.nan for q in quantiles})
+
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            array = values.to_numpy(dtype='float64', na_value=np.nan)
+            not_null = np.sort(array[~np.isnan(array)])
+            n = len(not_null)
+            stats['null_count'] = len(array) - n
+            stats['count'] = n
+            if n == 0:
+                stats.update({'distinct_count': 0, 'top_values': []})
+                return stats
+
+            # boundaries between runs of equal values give distinct values and their counts
+            starts = np.flatnonzero(np.r_[True, not_null[1:] != not_null[:-1]])
+            run_lengths = np.diff(np.r_[starts, n])
+            most_frequent = np.argsort(-run_lengths, kind='stable')[:top]
+
+            stats['mean'] = not_null.mean()
+            stats['var'] = not_null.var(ddof=1) if n > 1 else np.nan
+            stats['std'] = np.sqrt(stats['var'])
+            stats['min'] = not_null[0]
+            stats['max'] = not_null[-1]
+            # linear interpolation, as pandas.Series.quantile
+            stats.update({f'q{q:g}': value for q, value in zip(quantiles, np.quantile(not_null, quantiles))})
+            stats['distinct_count'] = len(starts)
+            stats['top_values'] = not_null[starts[most_frequent]].tolist()
+        else:
+            counts = values.value_counts(dropna=True)
+            stats['count'] = int(counts.sum())
+            stats['null_count'] = len(values) - stats['count']
+            stats['distinct_count'] = int((counts > 0).sum())
+            stats['top_values'] = counts.index[:top].tolist()
+
+        return stats
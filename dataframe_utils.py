@@ -1,7 +1,295 @@
-from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
+from outlier_utils import mad_bounds
+from scipy import special, stats
+import hashlib
 import numpy as np
 import pandas as pd
 
+# Fitted Box-Cox/Yeo-Johnson lambdas keyed by a hash of the column's values, see fit_power_transforms
+_POWER_LAMBDAS = {}
+
+
+def masked_log(values: pd.Series | pd.DataFrame, log1p: bool=False, out: np.ndarray | None=None) -> pd.Series | pd.DataFrame:
+    '''
+    This function takes the log of strictly positive values and sets every other value
+    (zero, negative or null) to 0, without a Python call per value.
+
+    Parameters:
+        values: The series or dataframe to transform.
+        log1p: If True log(1 + x) is used instead of log(x). Default = False.
+        out: Optional float64 array with the shape of values to write the result into,
+        so repeated transforms can reuse one buffer. Default = None.
+
+    Returns:
+        series or dataFrame: The transformed values, with the index (and columns) of values.
+    '''
+    array = values.to_numpy(dtype='float64', na_value=np.nan)
+    if out is None:
+        out = np.zeros_like(array)
+    else:
+        out[...] = 0
+    with np.errstate(invalid='ignore'):
+        positive = array > 0
+    (np.log1p if log1p else np.log)(array, out=out, where=positive)
+
+    if isinstance(values, pd.DataFrame):
+        return pd.DataFrame(out, index=values.index, columns=values.columns, copy=False)
+    return pd.Series(out, index=values.index, name=values.name, copy=False)
+
+
+def _hash_values(array: np.ndarray) -> str:
+    '''Returns a hash of an array's contents.'''
+    return hashlib.blake2b(np.ascontiguousarray(array).tobytes(), digest_size=16).hexdigest()
+
+
+def _fit_power_lambdas(array: np.ndarray) -> dict:
+    '''Fits Box-Cox (if the data is strictly positive) and Yeo-Johnson lambdas to an array.'''
+    lambdas = {'box-cox': None, 'yeo-johnson': float(stats.yeojohnson_normmax(array))}
+    if array.min() > 0:
+        lambdas['box-cox'] = float(stats.boxcox_normmax(array, method='mle'))
+    return lambdas
+
+
+def fit_power_transforms(values: pd.Series) -> dict:
+    '''
+    This function returns the fitted Box-Cox and Yeo-Johnson lambdas of a column, ignoring
+    nulls. Lambdas are cached by the column's contents, so a column is only fitted once.
+
+    Parameters:
+        values: The series to fit.
+
+    Returns:
+        dict: {'box-cox': float or None if the data is not strictly positive, 'yeo-johnson': float}
+    '''
+    array = values.dropna().to_numpy(dtype='float64')
+    key = _hash_values(array)
+    if key not in _POWER_LAMBDAS:
+        _POWER_LAMBDAS[key] = _fit_power_lambdas(array)
+    return _POWER_LAMBDAS[key]
+
+
+def _compare_column(column: str, array: np.ndarray, lambdas: dict | None) -> tuple[list[dict], dict]:
+    '''Returns the skew of a column before and after each transform, and the lambdas used.'''
+    if lambdas is None:
+        lambdas = _fit_power_lambdas(array)
+
+    transformed = {'original': array, 'log': masked_log(pd.Series(array)).to_numpy()}
+    if lambdas['box-cox'] is not None:
+        transformed['box-cox'] = stats.boxcox(array, lmbda=lambdas['box-cox'])
+    transformed['yeo-johnson'] = stats.yeojohnson(array, lmbda=lambdas['yeo-johnson'])
+
+    rows = [{'column': column, 'transform': name, 'skew': pd.Series(values).skew(), 'lambda': lambdas.get(name)}
+            for name, values in transformed.items()]
+    return rows, lambdas
+
+
+class PowerTransformer:
+    '''
+    A Box-Cox or Yeo-Johnson transformation with lambdas fitted once per column. After
+    fitting, transform and inverse_transform are plain vectorised numpy operations, so new
+    batches of data are transformed without refitting. The fitted transformer can be
+    saved with to_dict and restored with from_dict.
+
+    Example:
+        transformer = PowerTransformer('yeo-johnson').fit(df, ['annual_inc', 'dti'])
+        df[['annual_inc', 'dti']] = transformer.transform(df)
+        json.dump(transformer.to_dict(), file)
+    '''
+
+    def __init__(self, method: str='yeo-johnson', lambdas: dict[str, float] | None=None):
+        if method not in ('box-cox', 'yeo-johnson'):
+            raise ValueError(f"method must be 'box-cox' or 'yeo-johnson', not {method!r}.")
+        self.method = method
+        self.lambdas = dict(lambdas or {})
+
+    def fit(self, dataframe: pd.DataFrame, columns: str | list[str]) -> 'PowerTransformer':
+        '''
+        Fits a lambda for each column, ignoring nulls.
+
+        Parameters:
+            dataframe: The dataframe holding the columns.
+            columns: The name/s of the column/s to fit.
+
+        Returns:
+            The fitted transformer.
+        '''
+        for column in [columns] if isinstance(columns, str) else columns:
+            lmbda = fit_power_transforms(dataframe[column])[self.method]
+            if lmbda is None:
+                raise ValueError(f"Cannot fit a Box-Cox transform to {column} as data isn't strictly positive.")
+            self.lambdas[column] = lmbda
+        return self
+
+    def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Transforms the fitted columns of a dataframe with the stored lambdas.
+
+        Parameters:
+            dataframe: The dataframe to transform.
+
+        Returns:
+            dataFrame: The transformed columns, with the index of dataframe.
+        '''
+        return self.__apply(dataframe, inverse=False)
+
+    def inverse_transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Maps transformed columns back to their original scale.
+
+        Parameters:
+            dataframe: The dataframe of transformed columns.
+
+        Returns:
+            dataFrame: The columns on their original scale, with the index of dataframe.
+        '''
+        return self.__apply(dataframe, inverse=True)
+
+    def __apply(self, dataframe: pd.DataFrame, inverse: bool) -> pd.DataFrame:
+        '''Applies the (inverse) transform to every fitted column.'''
+        result = {}
+        for column, lmbda in self.lambdas.items():
+            values = dataframe[column].to_numpy(dtype='float64', na_value=np.nan)
+            if self.method == 'box-cox':
+                result[column] = special.inv_boxcox(values, lmbda) if inverse else special.boxcox(values, lmbda)
+            else:
+                result[column] = _inverse_yeojohnson(values, lmbda) if inverse else stats.yeojohnson(values, lmbda)
+        return pd.DataFrame(result, index=dataframe.index)
+
+    def to_dict(self) -> dict:
+        '''Returns the method and fitted lambdas as a JSON serialisable dictionary.'''
+        return {'method': self.method, 'lambdas': dict(self.lambdas)}
+
+    @classmethod
+    def from_dict(cls, params: dict) -> 'PowerTransformer':
+        '''
+        Restores a transformer saved with to_dict.
+
+        Parameters:
+            params: The dictionary returned by to_dict.
+        '''
+        return cls(params['method'], params['lambdas'])
+
+
+def _inverse_yeojohnson(values: np.ndarray, lmbda: float) -> np.ndarray:
+    '''Inverts the Yeo-Johnson transformation. Transformed values keep the sign of the originals.'''
+    result = np.full_like(values, np.nan)
+    positive = values >= 0
+    negative = values < 0
+    if abs(lmbda) < np.spacing(1.0):
+        result[positive] = np.expm1(values[positive])
+    else:
+        result[positive] = np.power(values[positive] * lmbda + 1, 1 / lmbda) - 1
+    if abs(lmbda - 2) < np.spacing(1.0):
+        result[negative] = -np.expm1(-values[negative])
+    else:
+        result[negative] = 1 - np.power(-(2 - lmbda) * values[negative] + 1, 1 / (2 - lmbda))
+    return result
+
+
+def _mode_value(values: pd.Series):
+    '''Returns the most frequent non-null value, the first in sort order if there is a tie (as mode()[0]).'''
+    counts = values.value_counts(sort=False)
+    # categorical columns also count the categories that do not occur
+    counts = counts[counts > 0]
+    if counts.empty:
+        return np.nan
+    tied = counts.index[counts.to_numpy() == counts.max()]
+    if isinstance(tied, pd.CategoricalIndex):
+        # categories sort by their codes, whether or not they are ordered
+        return tied[np.argmin(tied.codes)]
+    try:
+        return tied.sort_values()[0]
+    except TypeError:
+        return tied[0]
+
+
+class Imputer:
+    '''
+    Fills nulls with a strategy per column. All fill values are computed by fit in one
+    call per strategy and stored, so later batches are filled with the same values and
+    no statistics are recomputed. A fitted imputer can be saved with to_dict.
+
+    Example:
+        imputer = Imputer({'int_rate': 'median', 'term': 'mode', 'funded_amount': 'mean'})
+        imputer.fit_transform(df, inplace=True)
+    '''
+
+    STRATEGIES = ('mean', 'median', 'mode')
+
+    def __init__(self, strategies: dict, fill_values: dict | None=None):
+        '''
+        Parameters:
+            strategies: Dictionary mapping columns to 'mean', 'median', 'mode' or a
+            constant fill value.
+            fill_values: Previously fitted fill values, see to_dict. Default = None.
+        '''
+        self.strategies = dict(strategies)
+        self.fill_values = dict(fill_values or {})
+
+    def fit(self, dataframe: pd.DataFrame) -> 'Imputer':
+        '''
+        Computes the fill value of every column, ignoring nulls.
+
+        Parameters:
+            dataframe: The dataframe to fit.
+
+        Returns:
+            The fitted imputer.
+        '''
+        by_strategy = {}
+        for column, strategy in self.strategies.items():
+            key = strategy if isinstance(strategy, str) and strategy in self.STRATEGIES else 'constant'
+            by_strategy.setdefault(key, []).append(column)
+
+        if 'mean' in by_strategy:
+            self.fill_values.update(dataframe[by_strategy['mean']].mean().to_dict())
+        if 'median' in by_strategy:
+            self.fill_values.update(dataframe[by_strategy['median']].median().to_dict())
+        for column in by_strategy.get('mode', []):
+            self.fill_values[column] = _mode_value(dataframe[column])
+        for column in by_strategy.get('constant', []):
+            self.fill_values[column] = self.strategies[column]
+        return self
+
+    def transform(self, dataframe: pd.DataFrame, inplace: bool=False) -> pd.DataFrame:
+        '''
+        Fills the nulls of the fitted columns with the stored fill values.
+
+        Parameters:
+            dataframe: The dataframe to fill.
+            inplace: If True dataframe is filled in place instead of returning a copy.
+            Default = False.
+
+        Returns:
+            dataFrame: The filled dataframe (dataframe itself if inplace).
+        '''
+        fill_values = {column: value for column, value in self.fill_values.items() if column in dataframe.columns}
+        if inplace:
+            dataframe.fillna(fill_values, inplace=True)
+            return dataframe
+        return dataframe.fillna(fill_values)
+
+    def fit_transform(self, dataframe: pd.DataFrame, inplace: bool=False) -> pd.DataFrame:
+        '''
+        Fits the imputer to dataframe and fills its nulls, see fit and transform.
+        '''
+        return self.fit(dataframe).transform(dataframe, inplace=inplace)
+
+    def to_dict(self) -> dict:
+        '''Returns the strategies and fitted fill values as a dictionary.'''
+        return {'strategies': dict(self.strategies), 'fill_values': dict(self.fill_values)}
+
+    @classmethod
+    def from_dict(cls, params: dict) -> 'Imputer':
+        '''
+        Restores an imputer saved with to_dict.
+
+        Parameters:
+            params: The dictionary returned by to_dict.
+        '''
+        return cls(params['strategies'], params['fill_values'])
+
+
 class DataFrameTransform:
     
     def drop_columns(self, dataframe: pd.DataFrame, column: str | list[str]) -> pd.DataFrame:    
@@ -16,7 +304,7 @@ class DataFrameTransform:
         Returns:
             dataFrame: The updated dataframe.
         '''
-        return dataframe.drop(axis=1, columns=column)
+        return dataframe.drop(columns=column)
     
     def drop_nulls(self, dataframe, columns, how='any' ): 
         ''' 
@@ -121,23 +409,31 @@ class DataFrameTransform:
         
         '''
 
-        return dataframe[column].fillna(dataframe[column].mode()[0])
+        return dataframe[column].fillna(_mode_value(dataframe[column]))
     
     
-    def log_transform(self, dataframe: pd.DataFrame, column: str | list[str]) -> pd.Series | pd.DataFrame:
+    def log_transform(self, dataframe: pd.DataFrame, column: str | list[str], log1p: bool=False,
+                      inplace: bool=False) -> pd.Series | pd.DataFrame:
 
         '''
-        This method tranforms data using a log transformation.
+        This method tranforms data using a log transformation. Values that are not
+        strictly positive are set to 0.
         
         Parameters:
             dataframe: The dataframe to which this method will be applied.
             column/s: The name/s of the column/s that will be transformed
+            log1p: If True log(1 + x) is used instead of log(x). Default = False.
+            inplace: If True the transformed column/s are also written back into
+            dataframe. Default = False.
 
         Returns:
             dataFrame or series: A series if one column given else a dataframe.
         
         '''
-        return dataframe[column].map(lambda i: np.log(i) if i > 0 else 0)
+        log = masked_log(dataframe[column], log1p=log1p)
+        if inplace:
+            dataframe[column] = log
+        return log
     
 
     def box_cox_transform(self, dataframe: pd.DataFrame, column: str) -> pd.Series:
@@ -149,10 +445,9 @@ class DataFrameTransform:
             column: The name of the column that will be transformed
 
         Returns:
-            boxcox: The transformed column.
+            boxcox: The transformed column, with the index of dataframe.
         '''
-        boxcox = stats.boxcox(dataframe[column])
-        boxcox = pd.Series(boxcox[0])
+        boxcox = PowerTransformer('box-cox').fit(dataframe, column).transform(dataframe)[column]
         return boxcox
     
     def yeo_johnson_transform(self, dataframe: pd.DataFrame, column: str) -> pd.Series:
@@ -165,12 +460,45 @@ class DataFrameTransform:
             column: The name of the column that will be transformed
 
         Returns:
-            yeojohnson: The transformed column.
+            yeojohnson: The transformed column, with the index of dataframe.
         '''
-        yeojohnson = stats.yeojohnson(dataframe[column])
-        yeojohnson = pd.Series(yeojohnson[0])
+        yeojohnson = PowerTransformer('yeo-johnson').fit(dataframe, column).transform(dataframe)[column]
         return yeojohnson
     
+    def compare_transforms(self, dataframe: pd.DataFrame, columns: list[str], max_workers: int | None=None) -> pd.DataFrame:
+        '''
+        This method computes the skew of several columns before and after log, Box-Cox
+        and Yeo-Johnson transformations. Columns are evaluated in parallel processes,
+        each sent only its own values. Fitted lambdas are cached by column contents (see
+        fit_power_transforms), so columns that were already fitted, e.g. by an earlier call
+        or by Plotter.plot_transform_comparison, are not fitted again. Nulls are ignored.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            columns: The names of the columns that will be transformed.
+            max_workers: Number of processes. Default = None (one per CPU). Use 1 to
+            run in this process.
+
+        Returns:
+            dataFrame: One row per column and transform, with the skew and fitted lambda.
+            Box-Cox rows are left out for columns that are not strictly positive.
+        '''
+        arrays = {column: dataframe[column].dropna().to_numpy(dtype='float64') for column in columns}
+        keys = {column: _hash_values(array) for column, array in arrays.items()}
+        jobs = [(column, arrays[column], _POWER_LAMBDAS.get(keys[column])) for column in columns]
+
+        if max_workers == 1 or len(columns) == 1:
+            results = [_compare_column(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_compare_column, *zip(*jobs)))
+
+        rows = []
+        for column, (column_rows, lambdas) in zip(columns, results):
+            _POWER_LAMBDAS[keys[column]] = lambdas
+            rows.extend(column_rows)
+        return pd.DataFrame(rows)
+
     def transform_compare(self, dataframe, column):
         '''This method is used to test the effects of log, Box-Cox and Yeo-Johnson transformations.
 
@@ -181,23 +509,17 @@ class DataFrameTransform:
         Returns: Prints out the results.
 
         '''
-        original_skew = dataframe[column].skew()
-        print(f'Original skew: {round(original_skew, 2)}')
+        skew = self.compare_transforms(dataframe, [column], max_workers=1).set_index('transform')['skew']
 
-        log = self.log_transform(dataframe, column)
-        log_skew = round(log.skew(), 2) #type: ignore
-        print(f'Skew after log transform: {log_skew}')
+        print(f'Original skew: {round(skew["original"], 2)}')
+        print(f'Skew after log transform: {round(skew["log"], 2)}')
 
-        if dataframe[column].min() <= 0:
+        if 'box-cox' not in skew:
             print("Cannot perform Box-Cox transform as data isn't strictly positive")
         else:
-            box = self.box_cox_transform(dataframe, column)
-            box_skew = round(box.skew(), 2) #type: ignore
-            print(f'Skew after Box-Cox transform: {box_skew}')
+            print(f'Skew after Box-Cox transform: {round(skew["box-cox"], 2)}')
 
-        yeo = self.yeo_johnson_transform(dataframe, column)
-        yeo_skew = round(yeo.skew(), 2) #type: ignore
-        print(f'Skew after Yeo-Johnson transform: {yeo_skew}')
+        print(f'Skew after Yeo-Johnson transform: {round(skew["yeo-johnson"], 2)}')
 
     def drop_outliers_zscore(self, dataframe: pd.DataFrame, column: str, threshold: float) -> pd.DataFrame:
         '''
@@ -259,6 +581,91 @@ class DataFrameTransform:
         print(f'There are {len(outliers)} outliers in {column}.')
         
         return outliers
+
+    def outlier_bounds(self, dataframe: pd.DataFrame, columns: list[str], method: str='zscore',
+                       threshold: float | None=None) -> pd.DataFrame:
+        '''
+        This method computes the lower and upper outlier bounds of several columns in one
+        vectorised pass. Values outside the bounds are outliers. Nulls are ignored.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            columns: The names of the columns.
+            method: 'zscore' for mean -/+ threshold * standard deviation, 'iqr' for
+            Q1 - threshold * IQR and Q3 + threshold * IQR, or 'mad' for a modified z-score
+            (see outlier_utils.mad_bounds). Default = 'zscore'.
+            threshold: Default = 3.0 for 'zscore', 1.5 for 'iqr' and 3.5 for 'mad'.
+
+        Returns:
+            dataFrame: The 'lower' and 'upper' bounds, one row per column.
+        '''
+        values = dataframe[columns].to_numpy(dtype='float64', na_value=np.nan)
+        if method == 'zscore':
+            threshold = 3.0 if threshold is None else threshold
+            mean = np.nanmean(values, axis=0)
+            std = np.nanstd(values, axis=0, ddof=1)
+            lower, upper = mean - threshold * std, mean + threshold * std
+        elif method == 'iqr':
+            threshold = 1.5 if threshold is None else threshold
+            q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+            lower, upper = q1 - threshold * (q3 - q1), q3 + threshold * (q3 - q1)
+        elif method == 'mad':
+            return mad_bounds(dataframe, columns, 3.5 if threshold is None else threshold)
+        else:
+            raise ValueError(f"method must be 'zscore', 'iqr' or 'mad', not {method!r}.")
+
+        return pd.DataFrame({'lower': lower, 'upper': upper}, index=columns)
+
+    def detect_outliers(self, dataframe: pd.DataFrame, columns: list[str] | None=None, method: str='zscore',
+                        threshold: float | None=None, bounds: pd.DataFrame | None=None) -> tuple[pd.Series, pd.DataFrame]:
+        '''
+        This method flags the rows that are an outlier in any of the given columns, testing
+        all columns at once. Nulls are not outliers.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            columns: The names of the columns. Default = None (the columns of bounds).
+            method: 'zscore', 'iqr' or 'mad', see outlier_bounds. Default = 'zscore'.
+            threshold: see outlier_bounds.
+            bounds: Precomputed bounds from outlier_bounds, e.g. from a different batch
+            of data. Default = None (computed from dataframe).
+
+        Returns:
+            series: Boolean mask, True for rows with an outlier.
+            dataFrame: The bounds and number of outliers of each column.
+        '''
+        if bounds is None:
+            if columns is None:
+                raise ValueError('columns or bounds must be given.')
+            bounds = self.outlier_bounds(dataframe, columns, method, threshold)
+        columns = bounds.index.tolist()
+
+        values = dataframe[columns].to_numpy(dtype='float64', na_value=np.nan)
+        outliers = (values < bounds['lower'].to_numpy()) | (values > bounds['upper'].to_numpy())
+
+        report = bounds.copy()
+        report['outlier_count'] = outliers.sum(axis=0)
+        return pd.Series(outliers.any(axis=1), index=dataframe.index), report
+
+    def drop_outliers(self, dataframe: pd.DataFrame, columns: list[str] | None=None, method: str='zscore',
+                      threshold: float | None=None, bounds: pd.DataFrame | None=None) -> pd.DataFrame:
+        '''
+        This method drops the rows that are an outlier in any of the given columns in a
+        single filter. Does not do this in place.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            columns: The names of the columns. Default = None (the columns of bounds).
+            method: 'zscore', 'iqr' or 'mad', see outlier_bounds. Default = 'zscore'.
+            threshold: see outlier_bounds.
+            bounds: Precomputed bounds from outlier_bounds. Default = None.
+
+        Returns:
+            dataFrame: The dataframe with dropped rows.
+        '''
+        mask, report = self.detect_outliers(dataframe, columns, method, threshold, bounds)
+        print(f'{int(mask.sum())} rows have been removed from the dataframe.')
+        return dataframe[~mask.to_numpy()]
     
     ## Only relevent to loans database used in this project
     # def get_expected_revenue(self, dataframe):
@@ -1,5 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+import importlib.util
+import numpy as np
 import pandas as pd
 
+# Arrow backed strings let .str methods run as Arrow compute kernels
+STRING_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') is not None else 'string'
+
+# Matches the first (optionally signed, decimal) number in a string, e.g. '36 months', '10+ years'
+NUMBER_PATTERN = r'(-?\d+(?:\.\d+)?)'
+
+def _smallest_int_dtype(minimum, maximum, nullable: bool=False) -> str | None:
+    '''
+    Returns the smallest signed integer dtype that can hold values from minimum to maximum,
+    or None if no signed integer dtype can.
+    '''
+    for dtype in ['int8', 'int16', 'int32', 'int64']:
+        info = np.iinfo(dtype)
+        if info.min <= minimum and maximum <= info.max:
+            return dtype.capitalize() if nullable else dtype
+    return None
+
 #Class for converting data
 
 class DataTransform:
@@ -85,4 +105,179 @@ class DataTransform:
             Series: The updated series.
         '''
         return dataframe[column].str.replace(old, new, regex=regex)
-    
\ No newline at end of file
+
+    def clean_strings(self, dataframe: pd.DataFrame, column: str, rules: list[tuple], number_pattern: str | None=None,
+                      dtype: str | None=None) -> pd.Series:
+        '''
+        This method applies several string replacements to a column in one pass and can
+        parse a number out of each string, e.g. '36 months' -> 36, '10+ years' -> 10.
+
+        The rules are applied to the distinct values of the column only, which are then
+        mapped back to the rows, so columns with few distinct values such as term or
+        employment_length are cleaned in roughly the time of one hash pass. Strings are
+        held in Arrow backed arrays when pyarrow is installed.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            column: The name of the column that contains the strings.
+            rules: List of (old, new) or (old, new, regex) replacements, applied in order.
+            number_pattern: If given, a regex with one capture group used to extract a number
+            from each string after the replacements, e.g. NUMBER_PATTERN. Default = None.
+            dtype: The data type of the returned series. Default = None (string, or float64
+            if number_pattern is given).
+
+        Returns:
+            Series: The cleaned series.
+        '''
+        values = self.__clean_series(dataframe[column], rules, number_pattern)
+        return values if dtype is None else values.astype(dtype)
+
+    def __clean_series(self, values: pd.Series, rules: list[tuple], number_pattern: str | None=None) -> pd.Series:
+        '''Returns values with the string rules applied to each distinct value, see clean_strings.'''
+        codes, uniques = pd.factorize(values)
+        cleaned = pd.Series(uniques, dtype=STRING_DTYPE)
+
+        for rule in rules:
+            old, new, *regex = rule
+            cleaned = cleaned.str.replace(old, new, regex=bool(regex and regex[0]))
+
+        if number_pattern is not None:
+            cleaned = pd.to_numeric(cleaned.str.extract(number_pattern, expand=False)).astype('float64')
+
+        # codes of -1 are nulls in the original column
+        result = pd.api.extensions.take(cleaned.array, codes, allow_fill=True)
+        return pd.Series(result, index=values.index, name=values.name)
+
+    def apply_conversions(self, dataframe: pd.DataFrame, plan: dict[str, dict], inplace: bool=False,
+                          max_workers: int=1) -> pd.DataFrame:
+        '''
+        This method applies a conversion plan to several columns at once. Each column's
+        entry in the plan can contain (applied in this order):
+            'replace': a list of (old, new) or (old, new, regex) string replacements.
+            'type': the target type, e.g. 'float64', 'int64', 'category', 'string',
+            'datetime' or any other pandas dtype.
+            'format': the date format used when 'type' is 'datetime'.
+            'period': convert a datetime column to periods of this frequency, e.g. 'M'.
+
+        Example:
+            plan = {date: {'type': 'datetime', 'format': '%Y-%m-%d', 'period': 'M'}
+                    for date in ['issue_date', 'last_payment_date']}
+
+        Columns not in the plan are not copied. Independent columns can be converted
+        in parallel threads.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            plan: Dictionary mapping column names to their conversion.
+            inplace: If True the converted columns are written back into dataframe.
+            Default = False.
+            max_workers: Number of threads used to convert columns. Default = 1.
+
+        Returns:
+            dataFrame: The dataframe with converted columns.
+        '''
+        new_df = dataframe if inplace else dataframe.copy(deep=False)
+
+        if max_workers > 1 and len(plan) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {column: executor.submit(self.__convert_column, dataframe[column], spec)
+                           for column, spec in plan.items()}
+                converted = {column: future.result() for column, future in futures.items()}
+        else:
+            converted = {column: self.__convert_column(dataframe[column], spec) for column, spec in plan.items()}
+
+        for column, values in converted.items():
+            new_df[column] = values
+        return new_df
+
+    def __convert_column(self, values: pd.Series, spec: dict) -> pd.Series:
+        '''Returns values converted according to one column's entry of a conversion plan.'''
+        if spec.get('replace'):
+            values = self.__clean_series(values, spec['replace'])
+
+        dtype = spec.get('type')
+        if dtype == 'datetime':
+            values = pd.to_datetime(values, format=spec.get('format'))
+        elif dtype is not None:
+            values = values.astype(dtype)
+
+        if 'period' in spec:
+            values = values.dt.to_period(spec['period'])
+        return values
+
+    def optimize_memory(self, dataframe: pd.DataFrame, category_threshold: float=0.5, float_rtol: float=0.0,
+                        exclude: list[str]=[]) -> tuple[pd.DataFrame, pd.DataFrame]:
+        '''
+        This method converts every column of a dataframe to the smallest data type that
+        holds its values without loss:
+            - integers are downcast to the smallest signed int type.
+            - floats holding only whole numbers, at most 2**53 in magnitude, become ints, or
+              nullable Int types if they contain nulls. Other floats become float32 if that
+              keeps them within float_rtol.
+            - object/string columns become categorical if the number of distinct values
+              is at most category_threshold times the number of rows.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            category_threshold: Maximum ratio of distinct values to rows for a categorical
+            conversion. Default = 0.5.
+            float_rtol: Relative tolerance allowed when downcasting floats to float32.
+            Default = 0.0 (only exact conversions).
+            exclude: Columns to leave unchanged. Default = [].
+
+        Returns:
+            dataFrame: The optimized dataframe.
+            dataFrame: A report with the data type and memory (bytes) of each column
+            before and after.
+        '''
+        optimized = {}
+        for column in dataframe.columns:
+            values = dataframe[column]
+            if column not in exclude:
+                values = self.__optimize_series(values, category_threshold, float_rtol)
+            optimized[column] = values
+        new_df = pd.DataFrame(optimized, index=dataframe.index)
+
+        report = pd.DataFrame({
+            'dtype_before': dataframe.dtypes.astype(str),
+            'dtype_after': new_df.dtypes.astype(str),
+            'bytes_before': dataframe.memory_usage(deep=True, index=False),
+            'bytes_after': new_df.memory_usage(deep=True, index=False),
+        })
+        report['percentage_saved'] = round((1 - report['bytes_after'] / report['bytes_before']) * 100, 2)
+        return new_df, report
+
+    def __optimize_series(self, values: pd.Series, category_threshold: float, float_rtol: float) -> pd.Series:
+        '''Returns values converted to the smallest lossless data type, see optimize_memory.'''
+        if pd.api.types.is_bool_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            return values
+
+        if pd.api.types.is_integer_dtype(values):
+            if values.isna().all():
+                return values
+            nullable = pd.api.types.is_extension_array_dtype(values)
+            dtype = _smallest_int_dtype(values.min(), values.max(), nullable)
+            return values if dtype is None else values.astype(dtype)
+
+        if pd.api.types.is_float_dtype(values):
+            not_null = values.dropna().to_numpy(dtype='float64')
+            if len(not_null) == 0:
+                return values
+            # above 2**53 a float64 whole number may already be a rounded value
+            if (np.all(np.isfinite(not_null)) and np.abs(not_null).max() <= 2**53
+                    and np.all(np.mod(not_null, 1) == 0)):
+                nullable = len(not_null) < len(values)
+                dtype = _smallest_int_dtype(not_null.min(), not_null.max(), nullable)
+                if dtype is not None:
+                    return values.astype(dtype)
+            if values.dtype != 'float32':
+                as_float32 = not_null.astype('float32')
+                if np.allclose(as_float32, not_null, rtol=float_rtol, atol=0, equal_nan=True):
+                    return values.astype('float32')
+            return values
+
+        if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            if values.nunique() <= category_threshold * len(values):
+                return values.astype('category')
+
+        return values
@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from collections.abc import Iterator
+from sqlalchemy import column, create_engine, event, literal_column, or_, select, table
+import os
 import pandas as pd
 import yaml
 
@@ -23,34 +25,267 @@ def get_credentials(file_name: str) -> dict:
 
 # Function to save data to a csv file
 
-def save_to_csv(loan_dataframe: pd.DataFrame) -> None:
+def save_to_csv(loan_dataframe: pd.DataFrame, file_name: str='loan_payments.csv') -> None:
 
     '''
         This function saves a pandas dataframe to a .csv file
     
         parameters:
             loan_dataframe (pandas.DataFrame): The dataframe to write to a csv file
+            file_name (str): Name of the csv file. Default = 'loan_payments.csv'
     
     '''
 
-    loan_dataframe.to_csv('loan_payments.csv', index=False)
+    loan_dataframe.to_csv(file_name, index=False)
 
-def csv_to_dataframe(csv_file: str, parsedates=[]) -> pd.DataFrame:
+def save_chunks_to_csv(loan_chunks: Iterator[pd.DataFrame], file_name: str='loan_payments.csv') -> int:
+
+    '''
+        This function writes an iterator of pandas dataframes to a single .csv file,
+        appending one chunk at a time so only one chunk is held in memory.
+
+        parameters:
+            loan_chunks (Iterator[pandas.DataFrame]): The dataframe chunks to write, e.g.
+            from RDSDatabaseConnector.get_loan_data_chunks
+            file_name (str): Name of the csv file. Default = 'loan_payments.csv'
+
+        returns:
+            int: The number of rows written. If no chunk is yielded the file is removed,
+            so an earlier export is never mistaken for the new one.
+    '''
+
+    rows_written = 0
+    first_chunk = True
+    for chunk in loan_chunks:
+        # first chunk overwrites the file and writes the header, the rest append
+        chunk.to_csv(file_name, mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+        first_chunk = False
+        rows_written += len(chunk)
+
+    if first_chunk and os.path.exists(file_name):
+        os.remove(file_name)
+
+    return rows_written
+
+# Declared data types of the raw loan_payments table, applied at read time so pandas
+# does not have to infer them. Columns that can hold nulls use float32 or nullable Int types.
+LOAN_SCHEMA = {
+    'id': 'int32',
+    'member_id': 'int32',
+    'loan_amount': 'int32',
+    'funded_amount': 'float32',
+    'funded_amount_inv': 'float32',
+    'term': 'category',
+    'int_rate': 'float32',
+    'instalment': 'float32',
+    'grade': 'category',
+    'sub_grade': 'category',
+    'employment_length': 'category',
+    'home_ownership': 'category',
+    'annual_inc': 'float32',
+    'verification_status': 'category',
+    'loan_status': 'category',
+    'payment_plan': 'category',
+    'purpose': 'category',
+    'dti': 'float32',
+    'delinq_2yrs': 'Int16',
+    'inq_last_6mths': 'Int16',
+    'mths_since_last_delinq': 'float32',
+    'mths_since_last_record': 'float32',
+    'open_accounts': 'Int16',
+    'total_accounts': 'Int16',
+    'out_prncp': 'float32',
+    'out_prncp_inv': 'float32',
+    'total_payment': 'float32',
+    'total_payment_inv': 'float32',
+    'total_rec_prncp': 'float32',
+    'total_rec_int': 'float32',
+    'total_rec_late_fee': 'float32',
+    'recoveries': 'float32',
+    'collection_recovery_fee': 'float32',
+    'last_payment_amount': 'float32',
+    'collections_12_mths_ex_med': 'float32',
+    'mths_since_last_major_derog': 'float32',
+    'policy_code': 'int8',
+    'application_type': 'category',
+}
+
+# Date columns of the loan_payments table and their format in loan_payments.csv
+LOAN_DATE_COLUMNS = ['issue_date', 'earliest_credit_line', 'last_payment_date',
+                     'next_payment_date', 'last_credit_pull_date']
+LOAN_DATE_FORMAT = '%b-%Y'
+
+def csv_to_dataframe(csv_file: str, parsedates=[], schema: dict | None=None, usecols: list[str] | None=None,
+                     date_format: str | None=None, engine: str | None=None) -> pd.DataFrame:
     
     ''' 
         This function reads a csv file and returns a pandas dataframe
     
         parameters:
             csv_file: The csv_file to convert to a pandas DataFrame
+            parsedates: Columns to parse as dates. Default = []
+            schema: Mapping of column names to data types applied while reading, e.g.
+            LOAN_SCHEMA. Default = None (types are inferred)
+            usecols: Only read these columns. Default = None (all columns)
+            date_format: The format of the parsedates columns, e.g. LOAN_DATE_FORMAT.
+            Default = None (format is inferred)
+            engine: The pandas csv parser, 'c' or 'pyarrow'. Default = None ('c')
         
         return:
             pd.DataFrame
     '''
 
-    data = pd.read_csv(csv_file, parse_dates=parsedates)
+    if usecols is not None:
+        parsedates = [name for name in parsedates if name in usecols]
+        if schema is not None:
+            schema = {name: dtype for name, dtype in schema.items() if name in usecols}
+
+    data = pd.read_csv(csv_file, parse_dates=parsedates, dtype=schema, usecols=usecols,
+                       date_format=date_format, engine=engine)
 
     return data
 
+def load_loan_csv(csv_file: str='loan_payments.csv', usecols: list[str] | None=None,
+                  engine: str | None=None) -> pd.DataFrame:
+
+    '''
+        This function reads the raw loan_payments csv using the declared LOAN_SCHEMA
+        and parses the date columns with LOAN_DATE_FORMAT.
+
+        parameters:
+            csv_file: The loan csv file. Default = 'loan_payments.csv'
+            usecols: Only read these columns. Default = None (all columns)
+            engine: The pandas csv parser, 'c' or 'pyarrow'. Default = None ('c')
+
+        return:
+            pd.DataFrame
+    '''
+
+    return csv_to_dataframe(csv_file, parsedates=LOAN_DATE_COLUMNS, schema=LOAN_SCHEMA, usecols=usecols,
+                            date_format=LOAN_DATE_FORMAT, engine=engine)
+
+def save_to_snapshot(loan_dataframe: pd.DataFrame, file_name: str, row_group_size: int=50000) -> None:
+
+    '''
+        This function saves a pandas dataframe to a columnar Parquet or Feather file,
+        chosen by the file extension (.parquet or .feather). Unlike a csv the file keeps
+        the dataframe's dtypes, e.g. categories, periods, datetimes and downcast numerics.
+
+        parameters:
+            loan_dataframe (pandas.DataFrame): The dataframe to write
+            file_name (str): Name of the snapshot file
+            row_group_size (int): Rows per Parquet row group, the unit that row filters
+            can skip when reading. Default = 50000
+    '''
+
+    if file_name.endswith('.parquet'):
+        loan_dataframe.to_parquet(file_name, engine='pyarrow', index=False, row_group_size=row_group_size)
+    elif file_name.endswith('.feather'):
+        loan_dataframe.reset_index(drop=True).to_feather(file_name)
+    else:
+        raise ValueError(f'{file_name} is not a .parquet or .feather file.')
+
+def snapshot_to_dataframe(file_name: str, columns: list[str] | None=None, filters: list | None=None) -> pd.DataFrame:
+
+    '''
+        This function reads a Parquet or Feather snapshot written by save_to_snapshot
+        and returns a pandas dataframe with its stored dtypes.
+
+        parameters:
+            file_name (str): Name of the snapshot file
+            columns (list[str]): Only read these columns. Default = None (all columns)
+            filters (list): Parquet only. Row filters in pyarrow form, e.g.
+            [('loan_status', '==', 'Charged Off')]. Row groups that cannot match are
+            not read. Default = None
+
+        return:
+            pd.DataFrame
+    '''
+
+    if file_name.endswith('.parquet'):
+        return pd.read_parquet(file_name, engine='pyarrow', columns=columns, filters=filters)
+    elif file_name.endswith('.feather'):
+        if filters:
+            raise ValueError('Row filters are only supported for .parquet snapshots.')
+        return pd.read_feather(file_name, columns=columns)
+    else:
+        raise ValueError(f'{file_name} is not a .parquet or .feather file.')
+
+def get_watermark(loan_dataframe: pd.DataFrame, date_format: str='%b-%Y') -> dict:
+
+    '''
+        This function returns the high watermark of a local loan snapshot: the largest
+        id and the latest last_payment_date already pulled from the database.
+
+        parameters:
+            loan_dataframe (pandas.DataFrame): The local snapshot
+            date_format (str): The format of last_payment_date. Default = '%b-%Y'
+
+        returns:
+            dict: {'id': int | None, 'last_payment_date': pandas.Period | None}
+    '''
+
+    if loan_dataframe.empty:
+        return {'id': None, 'last_payment_date': None}
+
+    payment_dates = pd.to_datetime(loan_dataframe['last_payment_date'], format=date_format)
+    last_payment_date = payment_dates.max()
+
+    return {'id': int(loan_dataframe['id'].max()),
+            'last_payment_date': None if pd.isna(last_payment_date) else last_payment_date.to_period('M')}
+
+def upsert_loan_data(snapshot: pd.DataFrame, delta: pd.DataFrame, key: str='id') -> pd.DataFrame:
+
+    '''
+        This function merges newly fetched rows into a local snapshot. Rows in delta
+        replace rows in snapshot with the same key, new keys are appended.
+
+        parameters:
+            snapshot (pandas.DataFrame): The local snapshot
+            delta (pandas.DataFrame): The new or changed rows
+            key (str): The primary key column. Default = 'id'
+
+        returns:
+            pandas.DataFrame: The merged snapshot
+    '''
+
+    if delta.empty:
+        return snapshot
+
+    unchanged = snapshot[~snapshot[key].isin(delta[key])]
+    return pd.concat([unchanged, delta[snapshot.columns.intersection(delta.columns)]], ignore_index=True)
+
+def sync_loan_data(connector: 'RDSDatabaseConnector', file_name: str='loan_payments.csv',
+                   columns: list[str] | None=None) -> int:
+
+    '''
+        This function brings a local csv snapshot up to date by fetching only rows that
+        are new or changed since the snapshot's watermark and upserting them. If the
+        file does not exist, or is empty, the whole table is fetched.
+
+        parameters:
+            connector (RDSDatabaseConnector): Connector for the remote database
+            file_name (str): Name of the csv snapshot. Default = 'loan_payments.csv'
+            columns (list[str]): Columns to fetch. Default = None (all columns)
+
+        returns:
+            int: The number of rows fetched from the database
+    '''
+
+    if os.path.exists(file_name) and os.path.getsize(file_name) > 0:
+        snapshot = csv_to_dataframe(file_name)
+        columns = columns or snapshot.columns.tolist()
+    else:
+        snapshot = pd.DataFrame()
+
+    delta = connector.get_loan_data_increment(get_watermark(snapshot), columns=columns)
+    if snapshot.empty:
+        save_to_csv(delta, file_name)
+    else:
+        save_to_csv(upsert_loan_data(snapshot, delta), file_name)
+
+    return len(delta)
+
 
 
 # Class to extract data from RDS database
@@ -62,15 +297,44 @@ class RDSDatabaseConnector:
 
         Attributes: 
             PRIVATE
+
+        The connector owns a single SQLAlchemy engine which is created on first use and
+        reused by every extract. It can be used as a context manager, which disposes
+        of the engine's connection pool on exit.
     
     '''
 
-    def __init__(self, credentials):
+    def __init__(self, credentials, pool_size: int=5, max_overflow: int=10, pool_pre_ping: bool=True):
         self.__credentials = credentials
+        self.__pool_size = pool_size
+        self.__max_overflow = max_overflow
+        self.__pool_pre_ping = pool_pre_ping
+        self.__engine = None
+        self.__connections_opened = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.dispose()
+
+    def __count_connection(self, dbapi_connection, connection_record):
+        self.__connections_opened += 1
 
     def __get_database_connection(self):
 
-        ''' This function establishes a connection with the remote database using SQLAlchemy'''
+        ''' This function returns the connector's SQLAlchemy engine, creating it on first use'''
+
+        if self.__engine is None:
+            self.__engine = self.__create_engine()
+            # count new DBAPI connections so reuse of pooled connections can be checked
+            event.listen(self.__engine, 'connect', self.__count_connection)
+
+        return self.__engine
+
+    def __create_engine(self):
+
+        ''' This function creates a pooled engine for the remote database using SQLAlchemy'''
 
         DATABASE_TYPE = 'postgresql'
         DBAPI = 'psycopg2'
@@ -80,7 +344,37 @@ class RDSDatabaseConnector:
         PORT = self.__credentials['RDS_PORT']
         DATABASE = self.__credentials['RDS_DATABASE']
 
-        return create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}")
+        return create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}",
+                             pool_size=self.__pool_size, max_overflow=self.__max_overflow,
+                             pool_pre_ping=self.__pool_pre_ping)
+
+    def dispose(self) -> None:
+
+        '''This function closes all pooled connections and discards the engine'''
+
+        if self.__engine is not None:
+            self.__engine.dispose()
+            self.__engine = None
+
+    def get_pool_status(self) -> dict:
+
+        '''
+        This function returns statistics for the engine's connection pool.
+
+        Returns:
+            dict: The pool size, connections checked in/out, overflow and the total
+            number of database connections opened by this connector.
+        '''
+
+        status = {'connections_opened': self.__connections_opened}
+        if self.__engine is None:
+            return status
+
+        pool = self.__engine.pool
+        for name in ['size', 'checkedin', 'checkedout', 'overflow']:
+            if hasattr(pool, name):
+                status[name] = getattr(pool, name)()
+        return status
     
     def get_loan_data(self):
 
@@ -93,11 +387,68 @@ class RDSDatabaseConnector:
         )
         return data
 
+    def get_loan_data_chunks(self, chunk_size: int=10000) -> Iterator[pd.DataFrame]:
+
+        '''
+        This function streams the loan data from the RDS database using a server-side
+        cursor and yields it as Pandas DataFrames of at most chunk_size rows.
+
+        Parameters:
+            chunk_size: The number of rows in each DataFrame. Default = 10000.
+
+        Returns:
+            Iterator of DataFrames.
+        '''
+
+        engine = self.__get_database_connection()
+        with engine.connect() as connection:
+            # stream_results keeps the rows on the server until each chunk is fetched
+            connection = connection.execution_options(stream_results=True)
+            for chunk in pd.read_sql("select * FROM  loan_payments", con=connection, chunksize=chunk_size):
+                yield chunk
+
+    def get_loan_data_increment(self, watermark: dict, columns: list[str] | None=None,
+                                date_format: str='%b-%Y') -> pd.DataFrame:
+
+        '''
+        This function extracts only the loans that are new or changed since a watermark
+        (see get_watermark): rows with a larger id, or whose last_payment_date is in or
+        after the watermark month.
+
+        Parameters:
+            watermark: Dictionary with 'id' and 'last_payment_date' (a monthly pandas.Period).
+            Missing or None values are not filtered on.
+            columns: The columns to fetch. id and last_payment_date are always included.
+            Default = None (all columns).
+            date_format: The format of last_payment_date in the database. Default = '%b-%Y'.
+
+        Returns:
+            DataFrame of the new or changed rows.
+        '''
+
+        if columns:
+            columns = list(dict.fromkeys(['id', 'last_payment_date', *columns]))
+            query = select(*[column(name) for name in columns])
+        else:
+            query = select(literal_column('*'))
+        query = query.select_from(table('loan_payments'))
+
+        conditions = []
+        if watermark.get('id') is not None:
+            conditions.append(column('id') > watermark['id'])
+        if watermark.get('last_payment_date') is not None:
+            # dates are stored as text, so match the month labels from the watermark to now
+            months = pd.period_range(watermark['last_payment_date'], pd.Timestamp.today().to_period('M'), freq='M')
+            conditions.append(column('last_payment_date').in_(months.strftime(date_format).tolist()))
+        if conditions:
+            query = query.where(or_(*conditions))
+
+        return pd.read_sql(query, con=self.__get_database_connection())
+
 # run script to retrieve database and write it to a local csv file
 if __name__ == "__main__":
     
     credentials = get_credentials('C:/Users/JS/Documents/AiCore/Projects/EDA/credentials.yaml')
 
-    data = RDSDatabaseConnector(credentials).get_loan_data()
-    
-    save_to_csv(data)
+    with RDSDatabaseConnector(credentials) as connector:
+        save_chunks_to_csv(connector.get_loan_data_chunks())
@@ -0,0 +1,395 @@
+import numpy as np
+import pandas as pd
+
+# Revenue projections for the loan book. Dates are turned into integer month numbers
+# (months since January 1970, as pandas Period ordinals) so remaining terms are plain
+# array arithmetic, and the amount collected in each future month comes from a single
+# bincount over the remaining terms, whatever the length of the horizon.
+
+# Loan statuses still expected to pay, as used in milestone_04
+ACTIVE_STATUSES = ['Current', 'In Grace Period']
+
+# Loan statuses of each loss segment in milestone_04. Segments may overlap.
+CHARGED_OFF_STATUSES = ['Does not meet the credit policy. Status:Charged Off', 'Charged Off']
+LOSS_SEGMENTS = {
+    'charged_off': CHARGED_OFF_STATUSES,
+    'late': ['Late (31-120 days)', 'Late (16-30 days)'],
+    'default': ['Default'],
+    'defaulted': CHARGED_OFF_STATUSES + ['Default'],
+}
+
+
+def month_index(values: pd.Series, date_format: str | None=None) -> np.ndarray:
+    '''
+    This function converts dates to month numbers (months since January 1970).
+
+    Parameters:
+        values: Period, datetime or string dates.
+        date_format: The format of string dates, e.g. db_utils.LOAN_DATE_FORMAT.
+        Default = None (format is inferred)
+
+    Returns:
+        array: The month numbers as floats, NaN where the date is missing.
+    '''
+    if isinstance(values.dtype, pd.PeriodDtype):
+        if values.dt.freq != 'M':
+            values = values.dt.asfreq('M')
+        months = values.array.asi8.astype('float64')
+        months[values.isna().to_numpy()] = np.nan
+        return months
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, format=date_format)
+    return ((values.dt.year - 1970) * 12 + values.dt.month - 1).to_numpy(dtype='float64', na_value=np.nan)
+
+
+def term_months(values: pd.Series) -> np.ndarray:
+    '''
+    This function returns loan terms as a number of months. Terms can be numeric or
+    text such as '36 months'; text is parsed once per distinct value.
+
+    Parameters:
+        values: The term column.
+
+    Returns:
+        array: The terms as floats, NaN where the term is missing.
+    '''
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    codes, uniques = pd.factorize(values)
+    parsed = pd.Series(uniques).astype(str).str.extract(r'(\d+)', expand=False).astype('float64').to_numpy()
+    return np.where(codes >= 0, parsed[codes], np.nan)
+
+
+def _start_period(dataframe: pd.DataFrame, start, last_payment_column: str, date_format: str | None) -> pd.Period:
+    '''Returns the month projections start from, by default the latest payment date.'''
+    if start is None:
+        return pd.Period('1970-01', freq='M') + int(np.nanmax(month_index(dataframe[last_payment_column], date_format)))
+    return pd.Period(start, freq='M')
+
+
+def months_remaining(dataframe: pd.DataFrame, start=None, issue_column: str='issue_date',
+                     term_column: str='term', last_payment_column: str='last_payment_date',
+                     date_format: str | None=None) -> pd.Series:
+    '''
+    This function returns the number of instalments left on each loan, i.e. the months
+    between start and the end of the loan term (issue date + term).
+
+    Parameters:
+        dataframe: The loans.
+        start: The month to count from, e.g. '2022-01'. Default = None (latest payment date)
+        issue_column, term_column, last_payment_column: The column names.
+        date_format: The format of string dates. Default = None (format is inferred)
+
+    Returns:
+        series: The months left, negative for loans past their term and <NA> where a
+        date or term is missing.
+    '''
+    start_month = _start_period(dataframe, start, last_payment_column, date_format).ordinal
+    end_month = month_index(dataframe[issue_column], date_format) + term_months(dataframe[term_column])
+    return pd.Series(end_month - start_month, index=dataframe.index, name='months_left').astype('Int64')
+
+
+def project_revenue(dataframe: pd.DataFrame, horizon: int=6, statuses: list[str] | None=ACTIVE_STATUSES,
+                    start=None, amount_column: str='instalment', status_column: str='loan_status',
+                    **kwargs) -> pd.DataFrame:
+    '''
+    This function projects the revenue collected in each of the next horizon months,
+    assuming every loan pays its instalment until the end of its term.
+
+    Parameters:
+        dataframe: The loans.
+        horizon: The number of months to project. Default = 6
+        statuses: Only loans with these statuses are included, None for all loans.
+        Default = ACTIVE_STATUSES
+        start: The month before the first projected month. Default = None (latest payment date)
+        amount_column: The monthly payment column. Default = 'instalment'
+        status_column: The loan status column. Default = 'loan_status'
+        kwargs: Column names and date_format, passed to months_remaining.
+
+    Returns:
+        dataFrame: 'collected' and 'cumulative' revenue, indexed by month.
+    '''
+    start = _start_period(dataframe, start, kwargs.get('last_payment_column', 'last_payment_date'),
+                          kwargs.get('date_format'))
+    months_left = months_remaining(dataframe, start, **kwargs).to_numpy(dtype='float64', na_value=np.nan)
+    amounts = dataframe[amount_column].to_numpy(dtype='float64', na_value=0.0)
+
+    paying = months_left > 0
+    if statuses is not None:
+        paying &= dataframe[status_column].isin(statuses).to_numpy()
+
+    # a loan with m months left pays in months 1..m; loans beyond the horizon are binned at the horizon
+    last_month = np.minimum(months_left[paying], horizon).astype(np.int64)
+    ending = np.bincount(last_month, weights=amounts[paying], minlength=horizon + 1)
+    collected = np.cumsum(ending[::-1])[::-1][1:]
+
+    months = pd.period_range(start + 1, periods=horizon, freq='M')
+    return pd.DataFrame({'collected': collected, 'cumulative': np.cumsum(collected)}, index=months)
+
+
+def project_recovery(dataframe: pd.DataFrame, horizon: int=6, paid_column: str='total_payment',
+                     total_column: str='loan_amount', **kwargs) -> pd.Series:
+    '''
+    This function projects the percentage of the total loan amount recovered at the end
+    of each of the next horizon months, starting from the amount paid to date.
+
+    Parameters:
+        dataframe: The loans.
+        horizon: The number of months to project. Default = 6
+        paid_column: The column of amounts paid to date. Default = 'total_payment'
+        total_column: The column of loan amounts. Default = 'loan_amount'
+        kwargs: Passed to project_revenue.
+
+    Returns:
+        series: The percentage recovered, indexed by month, with the start month first.
+    '''
+    projection = project_revenue(dataframe, horizon, **kwargs)
+    paid = dataframe[paid_column].sum()
+    recovered = np.concatenate([[paid], paid + projection['cumulative'].to_numpy()])
+    months = pd.period_range(projection.index[0] - 1, periods=horizon + 1, freq='M')
+    return pd.Series(recovered / dataframe[total_column].sum() * 100, index=months, name='percentage_recovered')
+
+
+def segment_losses(dataframe: pd.DataFrame, segments: dict[str, list[str]]=LOSS_SEGMENTS,
+                   expected_revenue: np.ndarray | pd.Series | None=None, status_column: str='loan_status',
+                   term_column: str='term', instalment_column: str='instalment',
+                   paid_column: str='total_payment') -> pd.DataFrame:
+    '''
+    This function summarises the loans and their losses for each segment of loan statuses
+    in one pass over the rows, without filtering or copying the dataframe. The rows are
+    reduced per status and the statuses are then summed into their segments.
+
+    Parameters:
+        dataframe: The loans.
+        segments: Dictionary mapping segment names to loan statuses. Default = LOSS_SEGMENTS
+        expected_revenue: The expected revenue of each row, or a series indexed by row
+        position from LoanBook.expected_revenue. Default = None (term * instalment)
+        Loans with no expected revenue (NaN, or missing from the series) are counted in
+        the number of loans but left out of the revenue and loss columns.
+        status_column, term_column, instalment_column, paid_column: The column names.
+
+    Returns:
+        dataFrame: One row per segment, and 'all' for the whole book, with the number and
+        percentage of loans, expected revenue, collected revenue, projected loss
+        (expected less collected) and the loss as a percentage of the book's expected revenue.
+    '''
+    status = dataframe[status_column]
+    if isinstance(status.dtype, pd.CategoricalDtype):
+        codes, categories = status.cat.codes.to_numpy(), status.cat.categories
+    else:
+        codes, categories = pd.factorize(status)
+    if expected_revenue is None:
+        expected_revenue = term_months(dataframe[term_column]) * dataframe[instalment_column].to_numpy(dtype='float64', na_value=np.nan)
+    elif isinstance(expected_revenue, pd.Series):
+        # indexed by row position, as returned by LoanBook.expected_revenue
+        expected_revenue = expected_revenue.reindex(np.arange(len(dataframe)))
+    expected_revenue = np.asarray(expected_revenue, dtype='float64')
+    # as in milestone_04, loans with an unknown expected revenue add nothing to the revenue and loss
+    known = ~np.isnan(expected_revenue)
+    expected_revenue = np.where(known, expected_revenue, 0.0)
+    paid = np.where(known, np.nan_to_num(dataframe[paid_column].to_numpy(dtype='float64', na_value=np.nan)), 0.0)
+
+    # one bin per status, with missing statuses (code -1) in bin 0
+    bins = codes + 1
+    length = len(categories) + 1
+    per_status = np.stack([np.bincount(bins, minlength=length).astype('float64'),
+                           np.bincount(bins, weights=expected_revenue, minlength=length),
+                           np.bincount(bins, weights=paid, minlength=length)], axis=1)
+
+    membership = np.array([np.concatenate([[False], categories.isin(statuses)]) for statuses in segments.values()]
+                          + [np.ones(length, dtype=bool)]).reshape(-1, length)
+    totals = membership @ per_status
+
+    summary = pd.DataFrame(totals, index=pd.Index(list(segments) + ['all'], name='segment'),
+                           columns=['loans', 'expected_revenue', 'collected_revenue'])
+    summary['loans'] = summary['loans'].astype('int64')
+    summary['percentage_of_loans'] = summary['loans'] / max(len(dataframe), 1) * 100
+    summary['projected_loss'] = summary['expected_revenue'] - summary['collected_revenue']
+    summary['percentage_of_revenue'] = summary['projected_loss'] / summary.loc['all', 'expected_revenue'] * 100
+    return summary
+
+
+class LoanBook:
+    '''
+    The loan book as compact numpy arrays, one entry per loan, with amortisation
+    schedules computed for all loans at once. Schedules are built in chunks of loans,
+    so memory is bounded by chunk_size * longest term whatever the size of the book.
+
+    Each payment k of a loan pays interest on the balance left after payment k - 1 and
+    the rest of the instalment pays off principal; the last payment clears the balance.
+    Loans missing a principal, rate, term or issue date have no schedule and are left
+    out of the projections.
+
+    Example:
+        book = LoanBook.from_dataframe(df)
+        book.schedule(horizon=6)
+        book.projected_loss(['Charged Off'])
+    '''
+
+    def __init__(self, principal: np.ndarray, rate: np.ndarray, term: np.ndarray, issue_month: np.ndarray,
+                 instalment: np.ndarray | None=None, status: pd.Categorical | None=None,
+                 paid: np.ndarray | None=None, chunk_size: int=50000):
+        '''
+        Parameters:
+            principal: The amount borrowed.
+            rate: The annual interest rate in percent, e.g. 7.5.
+            term: The number of monthly payments.
+            issue_month: The month of issue, as a month number (see month_index).
+            instalment: The monthly payment. Default = None (annuity payment for the principal, rate and term)
+            status: The loan status. Default = None
+            paid: The amount paid to date. Default = None (nothing paid)
+            chunk_size: The number of loans scheduled at a time. Default = 50000
+        '''
+        self.principal = np.asarray(principal, dtype='float64')
+        self.rate = np.asarray(rate, dtype='float64') / 1200
+        term = np.asarray(term, dtype='float64')
+        issue_month = np.asarray(issue_month, dtype='float64')
+        # loans missing a value needed for the schedule get an empty one
+        self.valid = ~(np.isnan(self.principal) | np.isnan(self.rate) | np.isnan(term) | np.isnan(issue_month))
+        self.term = np.where(self.valid, term, 0).astype(np.int16)
+        self.issue_month = np.where(self.valid, issue_month, 0).astype(np.int32)
+        if instalment is None:
+            instalment = self.__annuity_payment()
+        self.instalment = np.asarray(instalment, dtype='float64')
+        self.status = pd.Categorical(status if status is not None else np.full(len(self.principal), np.nan))
+        self.paid = np.zeros(len(self.principal)) if paid is None else np.nan_to_num(np.asarray(paid, dtype='float64'))
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_dataframe(cls, dataframe: pd.DataFrame, principal_column: str='loan_amount', rate_column: str='int_rate',
+                       term_column: str='term', instalment_column: str | None='instalment',
+                       issue_column: str='issue_date', status_column: str | None='loan_status',
+                       paid_column: str | None='total_payment', date_format: str | None=None,
+                       chunk_size: int=50000) -> 'LoanBook':
+        '''
+        Builds a loan book from the loan_payments columns. Columns given as None are
+        not used, see __init__.
+
+        Parameters:
+            dataframe: The loans.
+            principal_column, rate_column, term_column, instalment_column, issue_column,
+            status_column, paid_column: The column names.
+            date_format: The format of string dates. Default = None (format is inferred)
+            chunk_size: The number of loans scheduled at a time. Default = 50000
+
+        Returns:
+            The loan book.
+        '''
+        def column(name):
+            return None if name is None else dataframe[name].to_numpy(dtype='float64', na_value=np.nan)
+
+        return cls(column(principal_column), column(rate_column), term_months(dataframe[term_column]),
+                   month_index(dataframe[issue_column], date_format), instalment=column(instalment_column),
+                   status=None if status_column is None else dataframe[status_column].array,
+                   paid=column(paid_column), chunk_size=chunk_size)
+
+    def __len__(self) -> int:
+        return len(self.principal)
+
+    def __annuity_payment(self) -> np.ndarray:
+        '''Returns the fixed monthly payment that repays each loan over its term.'''
+        term = np.maximum(self.term, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payment = self.principal * self.rate / (1 - (1 + self.rate) ** -term)
+        return np.where(self.rate > 0, payment, self.principal / term)
+
+    def status_mask(self, statuses: list[str] | None) -> np.ndarray:
+        '''
+        Returns a boolean mask of the loans with one of the statuses, or of every loan
+        if statuses is None.
+        '''
+        if statuses is None:
+            return np.ones(len(self), dtype=bool)
+        codes = self.status.categories.get_indexer(statuses)
+        return np.isin(self.status.codes, codes[codes >= 0])
+
+    def __chunk_schedule(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Returns the principal and interest of every payment of the loans at positions
+        rows, as (loans, longest term) arrays, and the month number of each payment.
+        '''
+        principal, rate, term = self.principal[rows], self.rate[rows], self.term[rows]
+        instalment = np.nan_to_num(self.instalment[rows])
+        max_term = int(term.max()) if len(term) else 0
+        k = np.arange(max_term + 1)
+
+        # balance after k payments, in closed form, and 0 from the last payment on
+        growth = (1 + rate[:, None]) ** k
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity = np.where(rate[:, None] > 0, (growth - 1) / rate[:, None], k)
+        balance = np.maximum(principal[:, None] * growth - instalment[:, None] * annuity, 0)
+        balance[k >= term[:, None]] = 0
+        balance[~self.valid[rows]] = 0
+
+        principal_paid = balance[:, :-1] - balance[:, 1:]
+        interest_paid = balance[:, :-1] * rate[:, None]
+        interest_paid[k[1:] > term[:, None]] = 0
+        months = self.issue_month[rows, None] + k[1:]
+        return principal_paid, interest_paid, months
+
+    def __chunks(self, mask: np.ndarray):
+        '''Yields the schedules of the loans in mask, chunk_size loans at a time.'''
+        rows = np.flatnonzero(mask)
+        for start in range(0, len(rows), self.chunk_size):
+            yield self.__chunk_schedule(rows[start:start + self.chunk_size])
+
+    def schedule(self, start=None, horizon: int | None=None, statuses: list[str] | None=None) -> pd.DataFrame:
+        '''
+        Returns the scheduled principal, interest and total payments of the loans per
+        calendar month.
+
+        Parameters:
+            start: Only payments after this month are included, e.g. '2022-01'.
+            Default = None (all payments)
+            horizon: The number of months after start to include. Default = None (to the last payment)
+            statuses: Only loans with these statuses are included. Default = None (all loans)
+
+        Returns:
+            dataFrame: 'principal', 'interest' and 'payment' indexed by month.
+        '''
+        mask = self.status_mask(statuses) & self.valid
+        if start is not None:
+            first = pd.Period(start, freq='M').ordinal + 1
+        else:
+            first = int(self.issue_month[mask].min()) + 1 if mask.any() else 0
+        if horizon is None:
+            horizon = max(int((self.issue_month[mask] + self.term[mask]).max()) - first + 1, 0) if mask.any() else 0
+
+        principal = np.zeros(horizon)
+        interest = np.zeros(horizon)
+        for principal_paid, interest_paid, months in self.__chunks(mask):
+            offsets = months - first
+            inside = (offsets >= 0) & (offsets < horizon)
+            principal += np.bincount(offsets[inside], weights=principal_paid[inside], minlength=horizon)
+            interest += np.bincount(offsets[inside], weights=interest_paid[inside], minlength=horizon)
+
+        months = pd.period_range(pd.Period('1970-01', freq='M') + first, periods=horizon, freq='M')
+        return pd.DataFrame({'principal': principal, 'interest': interest, 'payment': principal + interest},
+                            index=months)
+
+    def expected_revenue(self, statuses: list[str] | None=None) -> pd.Series:
+        '''
+        Returns the total of the scheduled payments of each loan with the given statuses,
+        indexed by loan position. Unlike term * instalment this accounts for the smaller
+        last payment.
+
+        Parameters:
+            statuses: The statuses of the loans. Default = None (all loans)
+        '''
+        rows = np.flatnonzero(self.status_mask(statuses) & self.valid)
+        totals = np.zeros(len(rows))
+        for start in range(0, len(rows), self.chunk_size):
+            principal_paid, interest_paid, _ = self.__chunk_schedule(rows[start:start + self.chunk_size])
+            totals[start:start + self.chunk_size] = (principal_paid + interest_paid).sum(axis=1)
+        return pd.Series(totals, index=rows, name='expected_revenue')
+
+    def projected_loss(self, statuses: list[str] | None=None) -> float:
+        '''
+        Returns the scheduled revenue not paid by the loans with the given statuses,
+        i.e. the total of their expected revenue less the amount paid to date.
+
+        Parameters:
+            statuses: The statuses of the loans. Default = None (all loans)
+        '''
+        expected = self.expected_revenue(statuses)
+        return float(expected.sum() - self.paid[expected.index].sum())
@@ -0,0 +1,228 @@
+from collections.abc import Iterable
+import numpy as np
+import pandas as pd
+
+# Outlier detection that is fitted on a bounded sample of rows and then scores the full
+# table in vectorised batches, so fitting time and memory do not grow with the table.
+
+
+class ReservoirSampler:
+    '''
+    Keeps a uniform random sample of at most size rows from dataframe chunks fed one at
+    a time (Algorithm R, applied to a whole chunk at once).
+    '''
+
+    def __init__(self, size: int, seed: int | None=None):
+        self.size = size
+        self.sample = None
+        self.seen = 0
+        self.__rng = np.random.default_rng(seed)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        '''
+        Adds a chunk of rows. Chunks must have the same columns.
+
+        Parameters:
+            chunk: The rows to add.
+        '''
+        if self.sample is None:
+            self.sample = chunk.iloc[:0].copy()
+        # fill the reservoir first, then row i replaces a random slot with probability size / (i + 1)
+        fill = min(max(self.size - len(self.sample), 0), len(chunk))
+        if fill:
+            self.sample = pd.concat([self.sample, chunk.iloc[:fill]], ignore_index=True)
+        rest = chunk.iloc[fill:]
+        if len(rest):
+            positions = self.__rng.integers(0, np.arange(self.seen + fill, self.seen + len(chunk)) + 1)
+            replace = positions < self.size
+            self.sample.iloc[positions[replace]] = rest[replace].to_numpy()
+        self.seen += len(chunk)
+
+
+def reservoir_sample(chunks: Iterable[pd.DataFrame], size: int, seed: int | None=None) -> pd.DataFrame:
+    '''
+    This function draws a uniform random sample of rows from a stream of dataframe chunks,
+    e.g. pd.read_csv(..., chunksize=100000), keeping at most size rows in memory.
+
+    Parameters:
+        chunks: The dataframes to sample from. They must have the same columns.
+        size: The number of rows to sample.
+        seed: Seed for the random number generator. Default = None.
+
+    Returns:
+        dataFrame: The sampled rows.
+    '''
+    sampler = ReservoirSampler(size, seed)
+    for chunk in chunks:
+        sampler.update(chunk)
+
+    return sampler.sample if sampler.sample is not None else pd.DataFrame()
+
+
+def mad_bounds(dataframe: pd.DataFrame, columns: list[str], threshold: float=3.5) -> pd.DataFrame:
+    '''
+    This function computes outlier bounds using the median absolute deviation (MAD).
+    Values with a modified z-score, 0.6745 * (x - median) / MAD, greater than threshold
+    in absolute value are outliers. Nulls are ignored. The bounds can be fitted on a
+    sample and passed to DataFrameTransform.detect_outliers.
+
+    Parameters:
+        dataframe: The dataframe (or sample) to fit.
+        columns: The names of the columns.
+        threshold: The modified z-score threshold. Default = 3.5.
+
+    Returns:
+        dataFrame: The 'lower' and 'upper' bounds, one row per column.
+    '''
+    values = dataframe[columns].to_numpy(dtype='float64', na_value=np.nan)
+    median = np.nanmedian(values, axis=0)
+    mad = np.nanmedian(np.abs(values - median), axis=0)
+    spread = threshold * mad / 0.6745
+    return pd.DataFrame({'lower': median - spread, 'upper': median + spread}, index=columns)
+
+
+def _average_path_length(n: np.ndarray | float) -> np.ndarray:
+    '''Average path length of an unsuccessful binary search tree lookup among n points.'''
+    n = np.asarray(n, dtype='float64')
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    large = n > 2
+    result[large] = 2.0 * (np.log(n[large] - 1.0) + np.euler_gamma) - 2.0 * (n[large] - 1.0) / n[large]
+    return result
+
+
+class IsolationForest:
+    '''
+    Multivariate outlier detection by isolation (Liu et al., 2008). Each tree splits a
+    small random subsample on random columns at random thresholds; outliers are isolated
+    in fewer splits. Trees are stored as flat numpy arrays and every row of a batch is
+    passed down a tree at once, so scoring is linear in the number of rows.
+
+    Example:
+        forest = IsolationForest(contamination=0.01, seed=0)
+        forest.fit(df, ['annual_inc', 'dti', 'loan_amount', 'instalment'])
+        outliers = forest.predict(df)
+    '''
+
+    def __init__(self, n_trees: int=100, sample_size: int=256, contamination: float=0.01,
+                 seed: int | None=None):
+        self.n_trees = n_trees
+        self.sample_size = sample_size
+        self.contamination = contamination
+        self.columns = []
+        self.fill_values = None
+        self.threshold = None
+        self.trees = []
+        self.__normaliser = 1.0
+        self.__rng = np.random.default_rng(seed)
+
+    def fit(self, data: pd.DataFrame | Iterable[pd.DataFrame], columns: list[str],
+            max_rows: int=100000) -> 'IsolationForest':
+        '''
+        Fits the forest on at most max_rows rows, drawn with reservoir_sample.
+
+        Parameters:
+            data: A dataframe, or an iterable of dataframe chunks.
+            columns: The numeric columns to use.
+            max_rows: The maximum number of rows sampled for fitting. Default = 100000.
+
+        Returns:
+            The fitted forest.
+        '''
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        sample = reservoir_sample((chunk[columns] for chunk in chunks), max_rows,
+                                  seed=int(self.__rng.integers(2**32)))
+
+        self.columns = list(columns)
+        self.fill_values = sample.median(numeric_only=True).reindex(self.columns).to_numpy(dtype='float64')
+        values = self.__to_array(sample)
+
+        psi = min(self.sample_size, len(values))
+        max_depth = int(np.ceil(np.log2(max(psi, 2))))
+        self.trees = [self.__build_tree(values[self.__rng.choice(len(values), psi, replace=False)], max_depth)
+                      for _ in range(self.n_trees)]
+        self.__normaliser = _average_path_length(np.array([psi]))[0] or 1.0
+
+        self.threshold = np.quantile(self.score(sample), 1 - self.contamination)
+        return self
+
+    def __to_array(self, dataframe: pd.DataFrame) -> np.ndarray:
+        '''Returns the fitted columns as a float array with nulls filled by the sample medians.'''
+        values = dataframe[self.columns].to_numpy(dtype='float64', na_value=np.nan)
+        return np.where(np.isnan(values), self.fill_values, values)
+
+    def __build_tree(self, values: np.ndarray, max_depth: int) -> dict:
+        '''
+        Builds one isolation tree as flat arrays of nodes. Leaves point to themselves and
+        split at +inf, so rows that reach a leaf stay there while the other rows continue.
+        '''
+        feature, split, left, right, path = [], [], [], [], []
+        stack = [(values, 0, None, None)]
+        while stack:
+            node_values, depth, parent, is_left = stack.pop()
+            node = len(feature)
+            if parent is not None:
+                (left if is_left else right)[parent] = node
+            feature.append(0)
+            split.append(np.inf)
+            left.append(node)
+            right.append(node)
+            # path length of a row ending here, with the expected length of the unbuilt subtree
+            path.append(depth + _average_path_length(np.array([len(node_values)]))[0])
+
+            if depth >= max_depth or len(node_values) <= 1:
+                continue
+            low, high = node_values.min(axis=0), node_values.max(axis=0)
+            candidates = np.flatnonzero(high > low)
+            if len(candidates) == 0:
+                continue
+            column = self.__rng.choice(candidates)
+            threshold = self.__rng.uniform(low[column], high[column])
+            feature[node] = column
+            split[node] = threshold
+            goes_left = node_values[:, column] < threshold
+            stack.append((node_values[~goes_left], depth + 1, node, False))
+            stack.append((node_values[goes_left], depth + 1, node, True))
+
+        return {'feature': np.array(feature), 'split': np.array(split), 'left': np.array(left),
+                'right': np.array(right), 'path': np.array(path), 'max_depth': max_depth}
+
+    def score(self, dataframe: pd.DataFrame, chunk_size: int=100000) -> pd.Series:
+        '''
+        Returns the anomaly score of each row, between 0 and 1. Scores close to 1 are
+        outliers, scores around 0.5 or below are normal.
+
+        Parameters:
+            dataframe: The rows to score.
+            chunk_size: Rows scored at a time, which bounds memory. Default = 100000.
+        '''
+        scores = np.empty(len(dataframe))
+        for start in range(0, len(dataframe), chunk_size):
+            values = self.__to_array(dataframe.iloc[start:start + chunk_size])
+            path_lengths = np.zeros(len(values))
+            for tree in self.trees:
+                path_lengths += self.__path_length(tree, values)
+            mean_path = path_lengths / len(self.trees)
+            scores[start:start + chunk_size] = 2.0 ** (-mean_path / self.__normaliser)
+        return pd.Series(scores, index=dataframe.index)
+
+    def __path_length(self, tree: dict, values: np.ndarray) -> np.ndarray:
+        '''Passes every row down a tree at once and returns the path lengths.'''
+        offsets = np.arange(len(values)) * values.shape[1]
+        flat_values = values.ravel()
+        node = np.zeros(len(values), dtype=np.int64)
+        for _ in range(tree['max_depth']):
+            goes_left = flat_values[offsets + tree['feature'][node]] < tree['split'][node]
+            node = np.where(goes_left, tree['left'][node], tree['right'][node])
+        return tree['path'][node]
+
+    def predict(self, dataframe: pd.DataFrame, chunk_size: int=100000) -> pd.Series:
+        '''
+        Returns a boolean mask, True for rows scored above the threshold fitted from
+        the contamination rate.
+
+        Parameters:
+            dataframe: The rows to test.
+            chunk_size: Rows scored at a time. Default = 100000.
+        '''
+        return self.score(dataframe, chunk_size) > self.threshold
@@ -0,0 +1,221 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from dataframe_utils import PowerTransformer, _mode_value, masked_log
+import numpy as np
+import pandas as pd
+
+# Runs independent per-column cleaning work (casts, imputation, skew transforms, outlier
+# tests) in a pool of processes. Numeric columns are copied once into a shared memory
+# block and workers read their column from it and write their result into a second
+# shared block, so neither the dataframe nor the numeric results are pickled. Only
+# non-numeric columns (cast or imputed) are sent to a worker, one column at a time.
+
+TASKS = ('cast', 'impute', 'log', 'power', 'outliers')
+
+
+def _attach(name: str, shape: tuple[int, int]) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    '''Attaches to a shared memory block created by ColumnExecutor and returns it as an array.'''
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype='float64', buffer=block.buf)
+
+
+def _run_numeric_task(task: str, params: dict, row: int, input_name: str, output_name: str,
+                      shape: tuple[int, int]):
+    '''Runs a task on row `row` of the shared input block and writes the result to the output block.'''
+    input_block, inputs = _attach(input_name, shape)
+    output_block, outputs = _attach(output_name, shape)
+    try:
+        return _compute(task, params, inputs[row], outputs[row])
+    finally:
+        # views must be released before the blocks can be closed
+        del inputs, outputs
+        input_block.close()
+        output_block.close()
+
+
+def _compute(task: str, params: dict, values: np.ndarray, out: np.ndarray):
+    '''Computes one column task into out and returns the fitted value, if any.'''
+    fitted = None
+    if task == 'log':
+        masked_log(pd.Series(values, copy=False), log1p=params.get('log1p', False), out=out)
+    elif task == 'impute':
+        not_null = values[~np.isnan(values)]
+        strategy = params['strategy']
+        if strategy == 'mean':
+            fitted = float(not_null.mean()) if len(not_null) else np.nan
+        elif strategy == 'median':
+            fitted = float(np.median(not_null)) if len(not_null) else np.nan
+        elif strategy == 'mode':
+            fitted = _mode_value(pd.Series(not_null))
+        else:
+            fitted = strategy
+        np.copyto(out, values)
+        out[np.isnan(values)] = fitted
+    elif task == 'power':
+        method = params.get('method', 'yeo-johnson')
+        frame = pd.DataFrame({'column': values})
+        transformer = PowerTransformer(method).fit(frame, 'column')
+        fitted = transformer.lambdas['column']
+        np.copyto(out, transformer.transform(frame)['column'].to_numpy())
+    elif task == 'outliers':
+        method = params.get('method', 'zscore')
+        threshold = params.get('threshold')
+        if method == 'zscore':
+            threshold = 3.0 if threshold is None else threshold
+            mean, std = np.nanmean(values), np.nanstd(values, ddof=1)
+            fitted = (float(mean - threshold * std), float(mean + threshold * std))
+        else:
+            threshold = 1.5 if threshold is None else threshold
+            q1, q3 = np.nanquantile(values, [0.25, 0.75])
+            fitted = (float(q1 - threshold * (q3 - q1)), float(q3 + threshold * (q3 - q1)))
+        out[:] = (values < fitted[0]) | (values > fitted[1])
+    else:
+        np.copyto(out, values)
+    return fitted
+
+
+def _run_object_task(task: str, params: dict, values: pd.Series) -> tuple[pd.Series, object]:
+    '''Casts or imputes one non-numeric column and returns it with the fitted value, if any.'''
+    if task == 'cast':
+        return values.astype(params['dtype']), None
+    strategy = params['strategy']
+    if strategy == 'mode':
+        fitted = _mode_value(values)
+    elif strategy in ('mean', 'median'):
+        raise TypeError(f'Cannot impute the {strategy} of non-numeric column {values.name!r}.')
+    else:
+        fitted = strategy
+    return values.fillna(fitted), fitted
+
+
+def _is_numeric(values: pd.Series) -> bool:
+    '''Returns True if a column can go through the float64 shared memory blocks.'''
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+
+def _restore_dtype(result: np.ndarray, dtype) -> pd.Series | np.ndarray:
+    '''Returns an imputed float64 column in its original data type, if no value changes.'''
+    if pd.api.types.is_float_dtype(dtype):
+        return pd.Series(result).astype(dtype).array
+    if pd.api.types.is_integer_dtype(dtype):
+        finite = np.isfinite(result)
+        nullable = isinstance(dtype, pd.api.extensions.ExtensionDtype)
+        info = np.iinfo(dtype.numpy_dtype if nullable else dtype)
+        if ((finite.all() or nullable) and np.all(result[finite] == np.round(result[finite]))
+                and np.all((result[finite] >= info.min) & (result[finite] <= info.max))):
+            return pd.Series(result).astype(dtype).array
+    return result
+
+
+class ColumnExecutor:
+    '''
+    Shards per-column cleaning tasks across a process pool. A task is one of:
+        ('cast', {'dtype': ...}): as DataTransform's to_* methods.
+        ('impute', {'strategy': 'mean' | 'median' | 'mode' | constant}): as the impute_* methods.
+        Imputed columns keep their data type when the fill value allows it.
+        ('log', {'log1p': False}): as DataFrameTransform.log_transform.
+        ('power', {'method': 'yeo-johnson' | 'box-cox'}): as PowerTransformer.
+        ('outliers', {'method': 'zscore' | 'iqr', 'threshold': ...}): flags outliers
+        in the column, see DataFrameTransform.detect_outliers.
+    Numeric columns go through shared memory; other columns can only be cast or
+    imputed ('mode' or a constant) and are pickled to a worker one at a time.
+
+    Example:
+        executor = ColumnExecutor(max_workers=8)
+        df, fitted = executor.transform(df, {'annual_inc': ('log', {}),
+                                             'int_rate': ('impute', {'strategy': 'median'})})
+    '''
+
+    def __init__(self, max_workers: int | None=None):
+        self.max_workers = max_workers
+
+    def transform(self, dataframe: pd.DataFrame, tasks: dict[str, tuple[str, dict]]) -> tuple[pd.DataFrame, dict]:
+        '''
+        Runs a task on each column in parallel.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            tasks: Dictionary mapping column names to (task, params).
+
+        Returns:
+            dataFrame: A copy of dataframe with the task results. For 'outliers' tasks the
+            column is replaced by a boolean outlier mask.
+            dict: The fitted value of each column (fill value, lambda or outlier bounds),
+            None for tasks that fit nothing.
+        '''
+        for column, (task, _) in tasks.items():
+            if task not in TASKS:
+                raise ValueError(f'Unknown task {task!r}, must be one of {TASKS}.')
+            if task in ('log', 'power', 'outliers') and not _is_numeric(dataframe[column]):
+                raise TypeError(f'The {task!r} task needs a numeric column, {column!r} is {dataframe[column].dtype}.')
+
+        numeric = [column for column, (task, params) in tasks.items()
+                   if _is_numeric(dataframe[column])
+                   and (task != 'cast' or pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(params['dtype'])))]
+        other = [column for column in tasks if column not in numeric]
+        shape = (len(numeric), len(dataframe))
+
+        new_df = dataframe.copy(deep=False)
+        fitted = {}
+        input_block = output_block = None
+        try:
+            if numeric:
+                size = max(shape[0] * shape[1] * 8, 1)
+                input_block = shared_memory.SharedMemory(create=True, size=size)
+                output_block = shared_memory.SharedMemory(create=True, size=size)
+                inputs = np.ndarray(shape, dtype='float64', buffer=input_block.buf)
+                for row, column in enumerate(numeric):
+                    inputs[row] = dataframe[column].to_numpy(dtype='float64', na_value=np.nan)
+
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                numeric_futures = {column: executor.submit(_run_numeric_task, tasks[column][0], tasks[column][1], row,
+                                                           input_block.name, output_block.name, shape)
+                                   for row, column in enumerate(numeric)}
+                other_futures = {column: executor.submit(_run_object_task, tasks[column][0], tasks[column][1],
+                                                         dataframe[column])
+                                 for column in other}
+
+                if numeric:
+                    outputs = np.ndarray(shape, dtype='float64', buffer=output_block.buf)
+                for row, column in enumerate(numeric):
+                    fitted[column] = numeric_futures[column].result()
+                    task, params = tasks[column]
+                    # copy out of the shared block before it is released
+                    result = outputs[row].copy()
+                    if task == 'outliers':
+                        result = result.astype(bool)
+                    elif task == 'cast':
+                        result = pd.Series(result).astype(params['dtype']).array
+                    elif task == 'impute':
+                        result = _restore_dtype(result, dataframe[column].dtype)
+                    new_df[column] = result
+                for column, future in other_futures.items():
+                    new_df[column], fitted[column] = future.result()
+        finally:
+            # drop the views before closing the blocks
+            inputs = outputs = None
+            for block in (input_block, output_block):
+                if block is not None:
+                    block.close()
+                    block.unlink()
+
+        return new_df, fitted
+
+    def outlier_mask(self, dataframe: pd.DataFrame, columns: list[str], method: str='zscore',
+                     threshold: float | None=None) -> tuple[pd.Series, dict]:
+        '''
+        Tests several columns for outliers in parallel.
+
+        Parameters:
+            dataframe: The dataframe to which this method will be applied.
+            columns: The names of the columns.
+            method: 'zscore' or 'iqr'. Default = 'zscore'.
+            threshold: Default = 3.0 for 'zscore' and 1.5 for 'iqr'.
+
+        Returns:
+            series: Boolean mask, True for rows with an outlier in any column.
+            dict: The (lower, upper) bounds of each column.
+        '''
+        tasks = {column: ('outliers', {'method': method, 'threshold': threshold}) for column in columns}
+        masks, bounds = self.transform(dataframe[columns], tasks)
+        return masks.any(axis=1), bounds
@@ -0,0 +1,482 @@
+from cache_utils import StepCache, fingerprint
+from contextlib import redirect_stdout
+from dataframe_utils import DataFrameTransform, Imputer, PowerTransformer, masked_log
+from datatransform_utils import DataTransform
+from db_utils import save_chunks_to_csv
+from outlier_utils import ReservoirSampler, mad_bounds
+from parallel_utils import ColumnExecutor
+from stream_stats import DataFrameAccumulator
+import io
+import time
+import numpy as np
+import pandas as pd
+
+# Lazily executed cleaning pipeline. Steps are recorded when the pipeline is built and
+# only run by CleaningPipeline.run, after the plan has been optimised:
+#   - column drops are moved ahead of earlier steps, and the dropped columns are removed
+#     from per-column steps such as casts, so no work is done on columns that are dropped.
+#   - row filters are moved ahead of earlier row-by-row steps (casts, log transforms) that
+#     do not write the columns they test, so those steps run on fewer rows.
+#   - adjacent steps of the same kind on different columns are fused into one step.
+# Steps that fit statistics (imputation, power transforms, outlier bounds, null thresholds)
+# are never reordered relative to row filters, so the results are unchanged.
+# run_chunked executes the same plan over a csv file in row chunks: statistics are first
+# accumulated chunk by chunk (see _StepStatistics), then every step is applied to each
+# chunk with those statistics and the result is appended to the output file.
+# With a StepCache, the result of each step is cached under a key chained from the input
+# fingerprint and the arguments of every step so far, so a run resumes from the last step
+# whose inputs and arguments are unchanged.
+
+
+class Step:
+    '''
+    One recorded pipeline step.
+
+    Attributes:
+        name: The name of the operation, e.g. 'convert' or 'drop_nulls'.
+        kind: 'drop_columns', 'filter_rows', 'map' (rewrites columns) or 'barrier'
+        (reads every column, nothing is moved past it).
+        columns: The columns the step reads, None for all columns.
+        params: The step's arguments.
+        row_local: True if each output row depends only on the same input row.
+        per_column: True if the step treats its columns independently, so columns can
+        be removed from it and it can be fused with a step of the same name.
+    '''
+
+    def __init__(self, name: str, kind: str, columns: list[str] | None, params: dict,
+                 row_local: bool=False, per_column: bool=False):
+        self.name = name
+        self.kind = kind
+        self.columns = columns
+        self.params = params
+        self.row_local = row_local
+        self.per_column = per_column
+        # fitted objects (Imputer, PowerTransformer, outlier bounds) from the last run
+        self.fitted = None
+
+    def __repr__(self):
+        return f'{self.name}({self.columns if self.columns is not None else "*"})'
+
+    def without_columns(self, columns: set) -> 'Step | None':
+        '''Returns a copy of a per-column step without the given columns, None if none remain.'''
+        keep = [column for column in self.columns if column not in columns]
+        if not keep:
+            return None
+        params = dict(self.params)
+        for key, value in params.items():
+            if isinstance(value, dict):
+                params[key] = {column: spec for column, spec in value.items() if column in keep}
+        params['columns'] = keep
+        return Step(self.name, self.kind, keep, params, self.row_local, self.per_column)
+
+
+class CleaningPipeline:
+    '''
+    Records cleaning steps over DataFrameTransform and DataTransform and runs them on
+    demand with an optimised plan. Every builder method returns the pipeline so calls
+    can be chained. The time, shape and memory after each step of the last run are
+    kept in report, and the steps of the last run, with their fitted state, in last_plan.
+
+    Example:
+        pipeline = (CleaningPipeline()
+                    .drop_nulls_threshold(0.5)
+                    .convert({'term': {'replace': [(' months', '')], 'type': 'float64'}})
+                    .drop_columns(['policy_code', 'application_type'])
+                    .drop_nulls(['last_payment_date'])
+                    .impute({'int_rate': 'median', 'term': 'mode'}))
+        print(pipeline.explain())
+        cleaned = pipeline.run(df)
+    '''
+
+    def __init__(self, optimize: bool=True, cache: StepCache | None=None, executor: ColumnExecutor | None=None):
+        '''
+        Parameters:
+            optimize: If True steps are reordered and fused before running. Default = True.
+            cache: Cache for step results, see cache_utils.StepCache. Default = None.
+            executor: If given, imputation of numeric columns and power transforms are
+            fitted and applied across its process pool, see parallel_utils.ColumnExecutor.
+            Default = None.
+        '''
+        self.optimize = optimize
+        self.cache = cache
+        self.executor = executor
+        self.steps = []
+        self.last_plan = []
+        self.report = pd.DataFrame()
+        self.__transform = DataFrameTransform()
+        self.__datatransform = DataTransform()
+
+    # Builder methods
+
+    def drop_columns(self, columns: str | list[str]) -> 'CleaningPipeline':
+        '''Records DataFrameTransform.drop_columns.'''
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        return self.__add(Step('drop_columns', 'drop_columns', columns, {'columns': columns}, True, True))
+
+    def drop_nulls_threshold(self, thresh: float) -> 'CleaningPipeline':
+        '''Records DataFrameTransform.drop_nulls_threshold.'''
+        return self.__add(Step('drop_nulls_threshold', 'barrier', None, {'thresh': thresh}))
+
+    def drop_nulls(self, columns: list[str] | None=None, how: str='any') -> 'CleaningPipeline':
+        '''Records DataFrameTransform.drop_nulls. If columns is None all columns are tested.'''
+        kind = 'filter_rows' if columns is not None else 'barrier'
+        return self.__add(Step('drop_nulls', kind, columns, {'columns': columns, 'how': how}, True))
+
+    def impute(self, strategies: dict) -> 'CleaningPipeline':
+        '''Records an Imputer with a strategy per column, see dataframe_utils.Imputer.'''
+        return self.__add(Step('impute', 'map', list(strategies), {'columns': list(strategies), 'strategies': strategies},
+                               per_column=True))
+
+    def convert(self, plan: dict[str, dict]) -> 'CleaningPipeline':
+        '''Records DataTransform.apply_conversions with a conversion plan.'''
+        return self.__add(Step('convert', 'map', list(plan), {'columns': list(plan), 'plan': plan}, True, True))
+
+    def log_transform(self, columns: str | list[str], log1p: bool=False) -> 'CleaningPipeline':
+        '''Records DataFrameTransform.log_transform.'''
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        return self.__add(Step('log_transform', 'map', columns, {'columns': columns, 'log1p': log1p}, True, True))
+
+    def power_transform(self, columns: str | list[str], method: str='yeo-johnson') -> 'CleaningPipeline':
+        '''Records a PowerTransformer fitted to and applied to the columns.'''
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        return self.__add(Step('power_transform', 'map', columns, {'columns': columns, 'method': method},
+                               per_column=True))
+
+    def drop_outliers(self, columns: list[str], method: str='zscore', threshold: float | None=None) -> 'CleaningPipeline':
+        '''Records DataFrameTransform.drop_outliers.'''
+        return self.__add(Step('drop_outliers', 'filter_rows', list(columns),
+                               {'columns': list(columns), 'method': method, 'threshold': threshold}))
+
+    def __add(self, step: Step) -> 'CleaningPipeline':
+        self.steps.append(step)
+        return self
+
+    # Planning
+
+    def plan(self) -> list[Step]:
+        '''Returns the steps in the order they will run.'''
+        if not self.optimize:
+            return list(self.steps)
+        return self.__fuse(self.__push_down(list(self.steps)))
+
+    def explain(self) -> str:
+        '''Returns a description of the recorded and the optimised plan.'''
+        recorded = '\n'.join(f'  {i}. {step}' for i, step in enumerate(self.steps, 1))
+        planned = '\n'.join(f'  {i}. {step}' for i, step in enumerate(self.plan(), 1))
+        return f'Recorded steps:\n{recorded}\nOptimised plan:\n{planned}'
+
+    def __push_down(self, steps: list[Step]) -> list[Step]:
+        '''Moves column drops and row filters ahead of the steps they can safely pass.'''
+        result = []
+        for step in steps:
+            position = len(result)
+            if step.kind == 'drop_columns':
+                dropped = set(step.columns)
+                while position > 0 and self.__can_pass_drop(result[position - 1], dropped):
+                    position -= 1
+                    previous = result[position]
+                    if previous.per_column and dropped & set(previous.columns):
+                        pruned = previous.without_columns(dropped)
+                        if pruned is None:
+                            del result[position]
+                        else:
+                            result[position] = pruned
+            elif step.kind == 'filter_rows':
+                tested = set(step.columns)
+                while position > 0 and self.__can_pass_filter(result[position - 1], tested):
+                    position -= 1
+            result.insert(position, step)
+        return result
+
+    def __can_pass_drop(self, previous: Step, dropped: set) -> bool:
+        '''A column drop can run before a step that does not need the dropped columns.'''
+        if previous.kind == 'barrier' or previous.columns is None:
+            return False
+        if previous.kind == 'filter_rows':
+            return not dropped & set(previous.columns)
+        return previous.per_column or not dropped & set(previous.columns)
+
+    def __can_pass_filter(self, previous: Step, tested: set) -> bool:
+        '''A row filter can run before a row-by-row step that does not write the tested columns.'''
+        if previous.kind == 'drop_columns':
+            return True
+        return previous.kind == 'map' and previous.row_local and not tested & set(previous.columns)
+
+    def __fuse(self, steps: list[Step]) -> list[Step]:
+        '''Merges adjacent per-column steps of the same operation on different columns.'''
+        result = []
+        for step in steps:
+            previous = result[-1] if result else None
+            if (previous is not None and step.per_column and previous.name == step.name
+                    and previous.params.keys() == step.params.keys()
+                    and all(previous.params[key] == step.params[key] for key in step.params
+                            if not isinstance(step.params[key], (dict, list)))
+                    and not set(previous.columns) & set(step.columns)):
+                columns = previous.columns + step.columns
+                params = {key: ({**value, **step.params[key]} if isinstance(value, dict) else value)
+                          for key, value in previous.params.items()}
+                params['columns'] = columns
+                result[-1] = Step(step.name, step.kind, columns, params, step.row_local, step.per_column)
+            else:
+                result.append(step)
+        return result
+
+    # Execution
+
+    def run(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Runs the optimised plan on a dataframe. The input dataframe is not changed.
+
+        Parameters:
+            dataframe: The dataframe to clean.
+
+        Returns:
+            dataFrame: The cleaned dataframe.
+        '''
+        plan = self.plan()
+        df = dataframe.copy(deep=False)
+        records = []
+        first = 0
+
+        if self.cache is not None:
+            key = fingerprint(dataframe)
+            keys = []
+            for step in plan:
+                key = self.cache.key(key, step.name, step.params)
+                keys.append(key)
+            first = self.__resume(plan, keys)
+            if first:
+                df = self.cache.get(keys[first - 1])[0]
+                records = [{'step': repr(step), 'seconds': 0.0, 'rows': None, 'columns': None, 'bytes': None,
+                            'cached': True} for step in plan[:first]]
+
+        for index in range(first, len(plan)):
+            step = plan[index]
+            start = time.perf_counter()
+            df = self.run_step(step, df)
+            if self.cache is not None:
+                self.cache.put(keys[index], df, step.fitted)
+            records.append({'step': repr(step), 'seconds': time.perf_counter() - start,
+                            'rows': df.shape[0], 'columns': df.shape[1],
+                            'bytes': int(df.memory_usage(deep=False).sum()), 'cached': False})
+        self.report = pd.DataFrame(records)
+        self.last_plan = plan
+        return df
+
+    def __resume(self, plan: list[Step], keys: list[str]) -> int:
+        '''Returns the number of leading steps with a cached result and restores their fitted state.'''
+        for index in range(len(plan), 0, -1):
+            if self.cache.contains(keys[index - 1]):
+                for step, key in zip(plan[:index], keys[:index]):
+                    step.fitted = self.cache.get_state(key)
+                return index
+        return 0
+
+    def run_step(self, step: Step, df: pd.DataFrame, fit: bool=True) -> pd.DataFrame:
+        '''
+        Runs one step on a dataframe.
+
+        Parameters:
+            step: The step.
+            df: The dataframe.
+            fit: If False, steps that fit statistics reuse step.fitted from an earlier
+            run instead of refitting. Default = True.
+
+        Returns:
+            dataFrame: The result of the step.
+        '''
+        params = step.params
+        if step.name == 'drop_columns':
+            return self.__transform.drop_columns(df, params['columns'])
+        if step.name == 'drop_nulls_threshold':
+            if fit or step.fitted is None:
+                new_df = self.__transform.drop_nulls_threshold(df, params['thresh'])
+                step.fitted = [column for column in df.columns if column not in new_df.columns]
+                return new_df
+            return df.drop(columns=[column for column in step.fitted if column in df.columns])
+        if step.name == 'drop_nulls':
+            return self.__transform.drop_nulls(df, params['columns'], how=params['how'])
+        if step.name == 'impute':
+            if (fit or step.fitted is None) and self.executor is not None and all(
+                    pd.api.types.is_numeric_dtype(df[column]) for column in params['columns']):
+                tasks = {column: ('impute', {'strategy': strategy}) for column, strategy in params['strategies'].items()}
+                df, fill_values = self.executor.transform(df, tasks)
+                step.fitted = Imputer(params['strategies'], fill_values)
+                return df
+            if fit or step.fitted is None:
+                step.fitted = Imputer(params['strategies']).fit(df)
+            df = df.copy(deep=False)
+            df[params['columns']] = step.fitted.transform(df[params['columns']])
+            return df
+        if step.name == 'convert':
+            return self.__datatransform.apply_conversions(df, params['plan'])
+        if step.name == 'log_transform':
+            df = df.copy(deep=False)
+            df[params['columns']] = masked_log(df[params['columns']], log1p=params['log1p'])
+            return df
+        if step.name == 'power_transform':
+            if (fit or step.fitted is None) and self.executor is not None:
+                tasks = {column: ('power', {'method': params['method']}) for column in params['columns']}
+                df, lambdas = self.executor.transform(df, tasks)
+                step.fitted = PowerTransformer(params['method'], lambdas)
+                return df
+            if fit or step.fitted is None:
+                step.fitted = PowerTransformer(params['method']).fit(df, params['columns'])
+            df = df.copy(deep=False)
+            df[params['columns']] = step.fitted.transform(df)
+            return df
+        if step.name == 'drop_outliers':
+            if fit or step.fitted is None:
+                step.fitted = self.__transform.outlier_bounds(df, params['columns'], params['method'], params['threshold'])
+            return self.__transform.drop_outliers(df, bounds=step.fitted)
+        raise ValueError(f'Unknown pipeline step {step.name!r}.')
+
+    def run_chunked(self, csv_file: str, output_file: str, chunksize: int=100000, sample_size: int=100000,
+                    **read_csv_kwargs) -> int:
+        '''
+        Runs the optimised plan over a csv file in chunks of rows and appends the cleaned
+        chunks to output_file, so memory use does not depend on the size of the file.
+
+        Steps that need whole-column statistics (null thresholds, imputation, power
+        transforms, outlier bounds) are fitted from earlier passes over the file: a pass
+        accumulates the statistics of every unfitted step it can reach, and a final pass
+        applies all steps with the fitted statistics. A plan without a null threshold step
+        usually takes two passes. Means, standard deviations and null counts are exact;
+        medians and quartiles come from a quantile sketch, modes from a frequent value
+        counter and power transform lambdas from a sample of sample_size rows.
+
+        Parameters:
+            csv_file: The csv file to clean.
+            output_file: The csv file the cleaned rows are written to.
+            chunksize: The number of rows read at a time. Default = 100000.
+            sample_size: Rows sampled to fit power transforms and MAD bounds. Default = 100000.
+            read_csv_kwargs: Other arguments passed to pandas.read_csv, e.g. dtype or usecols.
+
+        Returns:
+            int: The number of rows written.
+        '''
+        plan = self.plan()
+        for step in plan:
+            step.fitted = None
+
+        passes = 0
+        while any(_StepStatistics.needed(step) for step in plan):
+            statistics = {}
+            for chunk in pd.read_csv(csv_file, chunksize=chunksize, **read_csv_kwargs):
+                self.__accumulate(plan, chunk, statistics, sample_size)
+            for index, accumulator in statistics.items():
+                plan[index].fitted = accumulator.fit()
+            passes += 1
+
+        def cleaned_chunks():
+            for chunk in pd.read_csv(csv_file, chunksize=chunksize, **read_csv_kwargs):
+                with redirect_stdout(io.StringIO()):
+                    for step in plan:
+                        chunk = self.run_step(step, chunk, fit=False)
+                yield chunk
+
+        rows_written = save_chunks_to_csv(cleaned_chunks(), output_file)
+        print(f'{rows_written} rows have been written to {output_file} in {passes + 1} passes.')
+        self.last_plan = plan
+        return rows_written
+
+    def __accumulate(self, plan: list[Step], chunk: pd.DataFrame, statistics: dict, sample_size: int) -> None:
+        '''
+        Applies fitted steps to a chunk and feeds the unfitted steps that can be reached
+        in this pass. A step cannot be reached if it follows an unfitted step that changes
+        rows or columns, or if it reads columns written by an unfitted step.
+        '''
+        unfitted_columns = set()
+        with redirect_stdout(io.StringIO()):
+            for index, step in enumerate(plan):
+                if step.columns is None and unfitted_columns:
+                    return
+                if step.columns is not None and unfitted_columns & set(step.columns):
+                    return
+                if not _StepStatistics.needed(step):
+                    chunk = self.run_step(step, chunk, fit=False)
+                    continue
+
+                if index not in statistics:
+                    statistics[index] = _StepStatistics(step, sample_size)
+                statistics[index].update(chunk)
+                if step.kind != 'map':
+                    return
+                unfitted_columns.update(step.columns)
+
+
+class _StepStatistics:
+    '''Accumulates, over chunks of rows, the statistics a step needs to be fitted.'''
+
+    def __init__(self, step: Step, sample_size: int):
+        self.step = step
+        self.rows = 0
+        self.null_counts = None
+        self.accumulator = DataFrameAccumulator()
+        self.sampler = ReservoirSampler(sample_size, seed=0)
+
+    @staticmethod
+    def needed(step: Step) -> bool:
+        '''Returns True if the step fits statistics and has not been fitted yet.'''
+        if step.fitted is not None:
+            return False
+        if step.name == 'drop_outliers':
+            return True
+        if step.name in ('drop_nulls_threshold', 'power_transform'):
+            return True
+        if step.name == 'impute':
+            return any(strategy in Imputer.STRATEGIES for strategy in step.params['strategies'].values()
+                       if isinstance(strategy, str))
+        return False
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        '''Adds one chunk of the step's input.'''
+        self.rows += len(chunk)
+        if self.step.name == 'drop_nulls_threshold':
+            nulls = chunk.isna().sum()
+            self.null_counts = nulls if self.null_counts is None else self.null_counts.add(nulls, fill_value=0)
+        elif self.step.name == 'power_transform' or self.step.params.get('method') == 'mad':
+            self.sampler.update(chunk[self.step.columns])
+        else:
+            self.accumulator.update(chunk[self.step.columns])
+
+    def fit(self):
+        '''Returns the fitted state of the step, in the form run_step uses.'''
+        params = self.step.params
+        if self.step.name == 'drop_nulls_threshold':
+            # same rule as DataFrameTransform.drop_nulls_threshold
+            threshold = int((1 - params['thresh']) * self.rows) + 1
+            return self.null_counts.index[self.rows - self.null_counts < threshold].tolist()
+
+        if self.step.name == 'power_transform':
+            return PowerTransformer(params['method']).fit(self.sampler.sample, params['columns'])
+
+        columns = self.accumulator.columns
+        if self.step.name == 'impute':
+            fill_values = {}
+            for column, strategy in params['strategies'].items():
+                if strategy == 'mean':
+                    fill_values[column] = columns[column].moments.mean
+                elif strategy == 'median':
+                    fill_values[column] = float(columns[column].quantiles.quantile(0.5))
+                elif strategy == 'mode':
+                    fill_values[column] = next(iter(columns[column].frequent.top(1)), np.nan)
+                else:
+                    fill_values[column] = strategy
+            return Imputer(params['strategies'], fill_values)
+
+        # drop_outliers
+        method, threshold = params['method'], params['threshold']
+        if method == 'mad':
+            return mad_bounds(self.sampler.sample, params['columns'], 3.5 if threshold is None else threshold)
+        bounds = {}
+        for column in params['columns']:
+            if method == 'zscore':
+                moments = columns[column].moments
+                spread = (3.0 if threshold is None else threshold) * moments.std
+                bounds[column] = (moments.mean - spread, moments.mean + spread)
+            else:
+                q1, q3 = columns[column].quantiles.quantile([0.25, 0.75])
+                spread = (1.5 if threshold is None else threshold) * (q3 - q1)
+                bounds[column] = (q1 - spread, q3 + spread)
+        return pd.DataFrame.from_dict(bounds, orient='index', columns=['lower', 'upper'])
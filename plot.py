@@ -1,3 +1,5 @@
+from dataframe_utils import fit_power_transforms, masked_log
+from risk_utils import RiskCube
 from scipy import stats
 from statsmodels.graphics.gofplots import qqplot
 import matplotlib.pyplot as plt
@@ -135,7 +137,7 @@ class Plotter:
     def test_logtransform(self, dataframe, data, fig_size=(15,5)):
         '''This method applys a log transform  to the data and plots a histogram and qq plot'''
 
-        log = dataframe[data].map(lambda i: np.log(i) if i > 0 else 0)
+        log = masked_log(dataframe[data])
 
         fig, axes = plt.subplots(1,2,figsize=fig_size)
         t=sns.histplot(log,label="Skewness: %.2f"%(log.skew()), kde=True, ax=axes[0] )
@@ -159,21 +161,22 @@ class Plotter:
 
 
         # log transform
-        log = dataframe[data].map(lambda i: np.log(i) if i > 0 else 0)
+        log = masked_log(dataframe[data])
 
         t = sns.histplot(log,label="Skewness: %.2f"%(log.skew()), kde=True, ax=axes[0,1])
         t.legend(fontsize=font_size)
         t.set_title('Log Transform', fontsize=font_size)
         qqplot(log, scale=1 ,line='q', fit=True, ax=axes[1,1])
 
+        # Box-Cox and Yeo-Johnson lambdas, cached if the column was already fitted
+        lambdas = fit_power_transforms(dataframe[data])
+
         # Box-Cox
-        if dataframe[data].min() <= 0:
+        if lambdas['box-cox'] is None:
             axes[0,2].text(0.5, 0.5, 'Box-Cox transform not applied \nas data is not strictly positive.', 
                            horizontalalignment='center', verticalalignment='center', transform=axes[0,2].transAxes)
         else:
-            boxcox = dataframe[data]
-            boxcox = stats.boxcox(boxcox)
-            boxcox = pd.Series(boxcox[0])
+            boxcox = pd.Series(stats.boxcox(dataframe[data], lmbda=lambdas['box-cox']))
 
             b=sns.histplot(boxcox,label="Skewness: %.2f"%(boxcox.skew()), kde=True, ax=axes[0,2]) #type: ignore
             b.legend(fontsize=font_size)
@@ -182,9 +185,7 @@ class Plotter:
             qqplot(boxcox, scale=1 ,line='q', fit=True, ax=axes[1,2])
 
         # Yeo-Johnson
-        yeojohnson = dataframe[data]
-        yeojohnson = stats.yeojohnson(yeojohnson)
-        yeojohnson= pd.Series(yeojohnson[0])
+        yeojohnson = pd.Series(stats.yeojohnson(dataframe[data], lmbda=lambdas['yeo-johnson']))
 
         y=sns.histplot(yeojohnson,label="Skewness: %.2f"%(yeojohnson.skew()), kde=True, ax=axes[0,3] ) #type: ignore
         y.legend(fontsize=font_size)
@@ -283,11 +284,20 @@ class Plotter:
 
         plt.show()
 
-    def plot_risk_comparison(self, data_1: pd.DataFrame, data_2: pd.DataFrame, y_1: str, y_2: str, plot_title: str='', title_1: str='',
+    def plot_risk_comparison(self, data_1: pd.DataFrame | None, data_2: pd.DataFrame | None, y_1: str, y_2: str, plot_title: str='', title_1: str='',
                              title_2: str='', title_3_cat: str = 'category', ylabel_1: str='', ylabel_2: str='',
                              order_ascending: bool=False, stat: str='percent', fmt: str='%.2f',
-                             fig_size: tuple[float, float]=(15,10), padding: float=3.0):
-        '''This method plots to horizontal bar charts, one below the other, for making comparisons'''
+                             fig_size: tuple[float, float]=(15,10), padding: float=3.0,
+                             cube: RiskCube | None=None, segment: str='defaulted'):
+        '''This method plots to horizontal bar charts, one below the other, for making comparisons.
+        If a RiskCube is given the counts for column y_1 and the segment are read from it and
+        data_1 and data_2 are not used, so many charts can be drawn from one scan of the data.'''
+
+        if cube is not None:
+            table = cube.table(y_1)
+            counts_1, counts_2 = table['loans'], table[segment]
+        else:
+            counts_1, counts_2 = data_1[y_1].value_counts(), data_2[y_2].value_counts()
 
         sns.set_style("darkgrid")
         fig, (ax1, ax2, ax3) = plt.subplots(3,1, figsize=fig_size)
@@ -295,27 +305,27 @@ class Plotter:
         fig.tight_layout(pad=padding)
 
         #plot 1
-        sns.countplot(data=data_1, y = y_1, stat=stat, order=data_1[y_1].value_counts(ascending=order_ascending).index, ax=ax1)#type: ignore
+        values_1 = self.__count_stat(counts_1, stat)
+        sns.barplot(y=values_1.index, x=values_1, orient='h', order=counts_1.sort_values(ascending=order_ascending).index, ax=ax1)
         ax1.set_title(title_1)
         ax1.bar_label(ax1.containers[0], fmt=fmt, label_type='edge')#type: ignore
+        ax1.set_xlabel(stat)
         ax1.set_ylabel(ylabel_1)
 
         #plot 2
-        sns.countplot(data=data_2, y = y_2, stat=stat, order=data_2[y_2].value_counts(ascending=order_ascending).index, #type: ignore
-                          color='orange', ax=ax2)
+        values_2 = self.__count_stat(counts_2, stat)
+        sns.barplot(y=values_2.index, x=values_2, orient='h', order=counts_2.sort_values(ascending=order_ascending).index,
+                    color='orange', ax=ax2)
         ax2.set_title(title_2)
         ax2.bar_label(ax2.containers[0], fmt=fmt, label_type='edge') #type: ignore
+        ax2.set_xlabel(stat)
         ax2.set_ylabel(ylabel_2)
 
         #plot 3
-        a = data_2[y_2].value_counts()
-        b = data_1[y_1].value_counts()
-
-
-        percent = (a/b)*100
+        percent = (counts_2/counts_1)*100
         percent = percent.sort_values(ascending = False)
 
-        sns.barplot(y=percent.index, x=percent, orient = 'h', order=percent.index, color= 'red')
+        sns.barplot(y=percent.index, x=percent, orient = 'h', order=percent.index, color= 'red', ax=ax3)
         ax3.set_title(f'Percentage of defaulted loans in each {title_3_cat} of {ylabel_2}' )
         ax3.bar_label(ax3.containers[0], fmt=fmt, label_type='edge') #type: ignore
         ax3.set_xlabel('percent')
@@ -323,55 +333,49 @@ class Plotter:
 
         plt.show()
 
-    def plot_charged_default_comparison(self, data_1: pd.DataFrame, data_2: pd.DataFrame, column: str,
+    def __count_stat(self, counts: pd.Series, stat: str) -> pd.Series:
+        '''Scales value counts as seaborn's countplot does for stat.'''
+        if stat == 'percent':
+            return counts / counts.sum() * 100
+        if stat in ('proportion', 'probability'):
+            return counts / counts.sum()
+        return counts
+
+    def plot_charged_default_comparison(self, data_1: pd.DataFrame | None, data_2: pd.DataFrame | None, column: str,
                                         orientation: str='v', plot_title: str='', title_1: str='', title_2: str='',
                                         label_1: str='', label_2: str='', fmt: str='%.2f', 
-                                        fig_size: tuple[float, float]=(10,5), padding: float=3.0):
-        '''This method compares the distribtion of value counts as percentages of two dataframe columns'''
+                                        fig_size: tuple[float, float]=(10,5), padding: float=3.0,
+                                        cube: RiskCube | None=None, segment_1: str='charged_off', segment_2: str='defaulted'):
+        '''This method compares the distribtion of value counts as percentages of two dataframe columns.
+        If a RiskCube is given the counts of segment_1 and segment_2 are read from it instead
+        and data_1 and data_2 are not used.'''
+
+        if cube is not None:
+            table = cube.table(column)
+            counts = [table[segment_1], table[segment_2]]
+        else:
+            counts = [data_1[column].value_counts(), data_2[column].value_counts()]
 
         if orientation == 'v':
-
             fig, axes = plt.subplots(1,2, figsize = fig_size)
-            fig.suptitle(plot_title)
-            fig.tight_layout(pad=padding)
-
-            #plot 1
-            sns.countplot(data_1, x=column, stat='percent',
-                        order=data_1[column].value_counts(ascending=False).index,ax=axes[0])
-            axes[0].set_title(title_1)
-            axes[0].set_xlabel(label_1)
-            axes[0].set_ylabel(label_2)
-            axes[0].bar_label(axes[0].containers[0], fmt=fmt, label_type='edge') #type: ignore
-
-            #plot 2
-            sns.countplot(data_2, x=column, stat='percent',
-                        order=data_2[column].value_counts(ascending=False).index ,ax=axes[1])
-            axes[1].set_title(title_2)
-            axes[1].set_xlabel(label_1)
-            axes[1].set_ylabel(label_2)
-            axes[1].bar_label(axes[1].containers[0], fmt=fmt, label_type='edge') #type: ignore
-        
         elif orientation == 'h':
-
             fig, axes = plt.subplots(2,1, figsize = fig_size)
-            fig.suptitle(plot_title)
-            fig.tight_layout(pad=padding)
-
-            #plot 1
-            sns.countplot(data_1, y=column, stat='percent',
-                        order=data_1[column].value_counts(ascending=False).index,ax=axes[0])
-            axes[0].set_title(title_1)
-            axes[0].set_xlabel(label_1)
-            axes[0].set_ylabel(label_2)
-            axes[0].bar_label(axes[0].containers[0], fmt=fmt, label_type='edge') #type: ignore
-
-            #plot 2
-            sns.countplot(data_2, y=column, stat='percent',
-                        order=data_2[column].value_counts(ascending=False).index ,ax=axes[1])
-            axes[1].set_title(title_2)
-            axes[1].set_xlabel(label_1)
-            axes[1].set_ylabel(label_2)
-            axes[1].bar_label(axes[1].containers[0], fmt=fmt, label_type='edge') #type: igno
+        else:
+            return
+        fig.suptitle(plot_title)
+        fig.tight_layout(pad=padding)
+
+        for ax, column_counts, title in zip(axes, counts, [title_1, title_2]):
+            percent = self.__count_stat(column_counts, 'percent')
+            order = column_counts.sort_values(ascending=False).index
+            if orientation == 'v':
+                sns.barplot(x=percent.index, y=percent, orient='v', order=order, ax=ax)
+            else:
+                sns.barplot(y=percent.index, x=percent, orient='h', order=order, ax=ax)
+            ax.set_title(title)
+            ax.set_xlabel(label_1)
+            ax.set_ylabel(label_2)
+            ax.bar_label(ax.containers[0], fmt=fmt, label_type='edge') #type: ignore
 
         plt.show()
 
@@ -0,0 +1,290 @@
+from cache_utils import fingerprint
+from forecast_utils import LOSS_SEGMENTS
+from stream_stats import QuantileSketch
+import numpy as np
+import pandas as pd
+
+# Counts of loans by category for the loss indicator analysis in milestone_04. Every
+# dimension is reduced to integer codes and counted against the loan status codes with
+# one bincount, so the breakdowns for all dimensions come from a single scan of the
+# table and the plots read the counts instead of recounting the data.
+
+# Built cubes keyed by a hash of the columns they count and their arguments, see get_risk_cube
+_RISK_CUBES = {}
+
+# Income and debt-to-income bands used in milestone_04
+ANNUAL_INC_BINS = [0, 25000, 50000, 75000, 100000, 200000, 1000000]
+ANNUAL_INC_LABELS = ['0-25,000', '25,000-50,000', '50,000-75,000', '75,000-100,000', '100,000-200,000', '200,000+']
+DTI_BINS = [-0.001, 10.0, 20.0, 30.0, 40.0]
+DTI_LABELS = ['0-10', '10-20', '20-30', '30-40']
+
+
+class Binner:
+    '''
+    Splits a continuous column into bins, as pandas.cut, but gives each row an int8 bin
+    code (-1 for nulls and values outside the edges). The codes are computed once for the
+    whole dataframe and subsets take their codes by row position, see BinnedColumn.
+
+    Example:
+        binner = Binner(ANNUAL_INC_BINS, ANNUAL_INC_LABELS)
+        income = binner.bin(df['annual_inc'])
+        df['annual_inc_range'] = income.series()
+        charged_off['annual_inc_range'] = income.subset(charged_off)
+    '''
+
+    def __init__(self, edges: list[float] | np.ndarray, labels: list[str] | None=None,
+                 include_lowest: bool=False):
+        '''
+        Parameters:
+            edges: The increasing bin edges. Bins include their right edge, as pandas.cut.
+            labels: The bin labels. Default = None (intervals, as pandas.cut)
+            include_lowest: If True the first bin includes its left edge. Default = False
+        '''
+        self.edges = np.asarray(edges, dtype='float64')
+        if len(self.edges) < 2 or np.any(np.diff(self.edges) <= 0):
+            raise ValueError('Bin edges must be increasing and there must be at least two.')
+        if len(self.edges) - 1 > np.iinfo(np.int8).max:
+            raise ValueError(f'At most {np.iinfo(np.int8).max} bins are supported.')
+        if labels is None:
+            labels = pd.IntervalIndex.from_breaks(self.edges, closed='right')
+        elif len(labels) != len(self.edges) - 1:
+            raise ValueError('There must be one label per bin.')
+        self.labels = pd.Index(labels)
+        self.include_lowest = include_lowest
+
+    @classmethod
+    def from_quantiles(cls, values: pd.Series | np.ndarray, bins: int, labels: list[str] | None=None) -> 'Binner':
+        '''
+        Returns a binner with edges at the quantiles of values, so each bin holds about
+        the same number of rows. Repeated edges are merged, which can give fewer bins.
+
+        Parameters:
+            values: The values to fit, nulls are ignored.
+            bins: The number of bins.
+            labels: The bin labels. Default = None (intervals)
+        '''
+        edges = np.unique(np.nanquantile(np.asarray(values, dtype='float64'), np.linspace(0, 1, bins + 1)))
+        return cls(edges, labels, include_lowest=True)
+
+    @classmethod
+    def from_sketch(cls, sketch: QuantileSketch, bins: int, labels: list[str] | None=None) -> 'Binner':
+        '''
+        Returns a binner with edges at the approximate quantiles of a stream_stats.QuantileSketch,
+        e.g. from DataFrameAccumulator.columns['annual_inc'].quantiles, so data too large to
+        load can be binned chunk by chunk. The outer edges are open so no value falls outside.
+
+        Parameters:
+            sketch: The quantile sketch.
+            bins: The number of bins.
+            labels: The bin labels. Default = None (intervals)
+        '''
+        edges = np.unique(sketch.quantile(np.linspace(0, 1, bins + 1)))
+        edges[0], edges[-1] = -np.inf, np.inf
+        return cls(edges, labels)
+
+    def codes(self, values: pd.Series | np.ndarray) -> np.ndarray:
+        '''
+        Returns the bin code of each value.
+
+        Parameters:
+            values: The values to bin.
+
+        Returns:
+            array: int8 bin codes, -1 for nulls and values outside the edges.
+        '''
+        values = np.asarray(values, dtype='float64')
+        # value in (edges[i - 1], edges[i]] gives position i, i.e. bin i - 1
+        codes = np.searchsorted(self.edges, values, side='left') - 1
+        if self.include_lowest:
+            codes[values == self.edges[0]] = 0
+        codes[(codes < 0) | (codes >= len(self.labels)) | np.isnan(values)] = -1
+        return codes.astype(np.int8)
+
+    def __repr__(self) -> str:
+        return f'Binner({self.edges.tolist()}, {self.labels.tolist()}, include_lowest={self.include_lowest})'
+
+    def bin(self, values: pd.Series) -> 'BinnedColumn':
+        '''
+        Bins a column.
+
+        Parameters:
+            values: The column to bin.
+
+        Returns:
+            The bin codes of the column with its index, see BinnedColumn.
+        '''
+        return BinnedColumn(self.codes(values.to_numpy(dtype='float64', na_value=np.nan)), self.labels, values.index)
+
+
+class BinnedColumn:
+    '''
+    The int8 bin codes of a column and the index of the dataframe they were computed for.
+    Subsets of the dataframe take their codes by row position instead of binning again.
+    '''
+
+    def __init__(self, codes: np.ndarray, labels: pd.Index, index: pd.Index):
+        self.codes = codes
+        self.labels = labels
+        self.index = index
+
+    def series(self) -> pd.Series:
+        '''Returns the bins as a categorical series with the dataframe's index.'''
+        return pd.Series(pd.Categorical.from_codes(self.codes, self.labels, ordered=True), index=self.index)
+
+    def subset(self, rows: pd.DataFrame | pd.Series | pd.Index | np.ndarray) -> pd.Series:
+        '''
+        Returns the bins of a subset of the rows as a categorical series.
+
+        Parameters:
+            rows: A dataframe or series taken from the binned dataframe (matched by index
+            label), its index, a boolean mask (a boolean series is aligned on the binned
+            index) or an array of positions.
+
+        Returns:
+            series: The bins, indexed as rows.
+        '''
+        if isinstance(rows, pd.Series) and pd.api.types.is_bool_dtype(rows):
+            if not rows.index.equals(self.index):
+                rows = rows.reindex(self.index)
+                if rows.isna().any():
+                    raise ValueError('The mask does not cover every row of the binned dataframe.')
+            rows = rows.to_numpy(dtype=bool)
+        elif isinstance(rows, (pd.DataFrame, pd.Series)):
+            rows = rows.index
+        if isinstance(rows, pd.Index):
+            positions = self.index.get_indexer(rows)
+            if np.any(positions < 0):
+                raise ValueError('The rows are not all in the binned dataframe.')
+            index = rows
+        else:
+            rows = np.asarray(rows)
+            if rows.dtype == bool:
+                if len(rows) != len(self.index):
+                    raise ValueError('The mask must have one value per row of the binned dataframe.')
+                positions = np.flatnonzero(rows)
+            else:
+                positions = rows
+            index = self.index[positions]
+        return pd.Series(pd.Categorical.from_codes(self.codes[positions], self.labels, ordered=True), index=index)
+
+
+def _codes(values: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    '''Returns the integer codes (-1 for nulls) and the categories of a column.'''
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy().astype(np.int64), values.cat.categories
+    codes, categories = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), pd.Index(categories)
+
+
+class RiskCube:
+    '''
+    The number of loans and the number in each loss segment (see forecast_utils.LOSS_SEGMENTS)
+    for every category of the chosen dimensions, and for every pair of categories of the
+    chosen pairs of dimensions.
+
+    Example:
+        cube = RiskCube(df, ['purpose', 'grade', 'home_ownership', 'term', 'annual_inc'], pairs=[('grade', 'term')],
+                        bins={'annual_inc': Binner(ANNUAL_INC_BINS, ANNUAL_INC_LABELS)})
+        cube.table('grade')
+        plot.plot_risk_comparison(None, None, 'grade', 'grade', cube=cube)
+    '''
+
+    def __init__(self, dataframe: pd.DataFrame, dimensions: list[str], pairs: list[tuple[str, str]]=[],
+                 segments: dict[str, list[str]]={'charged_off': LOSS_SEGMENTS['charged_off'],
+                                                 'defaulted': LOSS_SEGMENTS['defaulted']},
+                 status_column: str='loan_status', bins: dict[str, Binner]={}):
+        '''
+        Parameters:
+            dataframe: The loans.
+            dimensions: The columns to break the loans down by.
+            pairs: Pairs of columns to break the loans down by jointly. Default = []
+            segments: Dictionary mapping segment names to loan statuses. Default = charged
+            off and defaulted loans.
+            status_column: The loan status column. Default = 'loan_status'
+            bins: Dictionary mapping continuous columns to the Binner that splits them
+            into categories, e.g. {'annual_inc': Binner(ANNUAL_INC_BINS, ANNUAL_INC_LABELS)}.
+            Default = {}
+        '''
+        self.dimensions = list(dimensions)
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.segments = dict(segments)
+        self.rows = len(dataframe)
+        self.__tables = {}
+
+        status_codes, statuses = _codes(dataframe[status_column])
+        status_bins = status_codes + 1
+        # which status codes (shifted by one for nulls) belong to each segment
+        self.__membership = np.array([np.concatenate([[False], statuses.isin(members)])
+                                      for members in self.segments.values()]).reshape(-1, len(statuses) + 1)
+        self.__statuses = len(statuses) + 1
+
+        codes = {}
+        for column in dict.fromkeys(self.dimensions + [column for pair in self.pairs for column in pair]):
+            if column in bins:
+                codes[column] = bins[column].codes(dataframe[column].to_numpy(dtype='float64', na_value=np.nan)).astype(np.int64), bins[column].labels
+            else:
+                codes[column] = _codes(dataframe[column])
+        for column in self.dimensions:
+            column_codes, categories = codes[column]
+            counts = self.__count(column_codes + 1, len(categories) + 1, status_bins)
+            # the first bin holds the nulls, which are left out as in value_counts
+            self.__tables[column] = self.__segment_table(counts[1:], pd.Index(categories, name=column))
+        for first, second in self.pairs:
+            (first_codes, first_categories), (second_codes, second_categories) = codes[first], codes[second]
+            width = len(second_categories) + 1
+            counts = self.__count((first_codes + 1) * width + second_codes + 1,
+                                  (len(first_categories) + 1) * width, status_bins)
+            counts = counts.reshape(len(first_categories) + 1, width, -1)[1:, 1:].reshape(-1, self.__statuses)
+            index = pd.MultiIndex.from_product([first_categories, second_categories], names=[first, second])
+            self.__tables[(first, second)] = self.__segment_table(counts, index)
+
+    def __count(self, bins: np.ndarray, length: int, status_bins: np.ndarray) -> np.ndarray:
+        '''Returns the number of loans in each (bin, status) as a (length, statuses) array.'''
+        counts = np.bincount(bins * self.__statuses + status_bins, minlength=length * self.__statuses)
+        return counts.reshape(length, self.__statuses)
+
+    def __segment_table(self, counts: np.ndarray, index: pd.Index) -> pd.DataFrame:
+        '''Sums the status counts into the number of loans and the number in each segment.'''
+        table = pd.DataFrame({'loans': counts.sum(axis=1)}, index=index)
+        for name, members in zip(self.segments, self.__membership):
+            table[name] = counts[:, members].sum(axis=1)
+        return table
+
+    def table(self, dimension: str | tuple[str, str]) -> pd.DataFrame:
+        '''
+        Returns the breakdown of a dimension, or of a pair of dimensions.
+
+        Parameters:
+            dimension: The column name, or a pair of column names given in pairs.
+
+        Returns:
+            dataFrame: One row per category (pair of categories), with the number of loans,
+            the number in each segment, the percentage of all loans ('percent'), the
+            percentage of each segment's loans ('<segment>_percent') and the percentage of
+            the category's loans in each segment ('<segment>_rate').
+        '''
+        counts = self.__tables[tuple(dimension) if isinstance(dimension, (list, tuple)) else dimension]
+        table = counts.copy()
+        table['percent'] = counts['loans'] / max(counts['loans'].sum(), 1) * 100
+        for name in self.segments:
+            table[f'{name}_percent'] = counts[name] / max(counts[name].sum(), 1) * 100
+            with np.errstate(divide='ignore', invalid='ignore'):
+                table[f'{name}_rate'] = counts[name] / counts['loans'] * 100
+        return table
+
+
+def get_risk_cube(dataframe: pd.DataFrame, dimensions: list[str], pairs: list[tuple[str, str]]=[],
+                  status_column: str='loan_status', **kwargs) -> RiskCube:
+    '''
+    This function returns a RiskCube of the dataframe, reusing the cube built by an earlier
+    call with the same columns, values and arguments. Arguments are as RiskCube.
+
+    Returns:
+        The risk cube.
+    '''
+    columns = list(dict.fromkeys([status_column, *dimensions, *(column for pair in pairs for column in pair)]))
+    key = (fingerprint(dataframe[columns]), tuple(dimensions), tuple(map(tuple, pairs)), status_column,
+           repr(sorted(kwargs.items())))
+    if key not in _RISK_CUBES:
+        _RISK_CUBES[key] = RiskCube(dataframe, dimensions, pairs, status_column=status_column, **kwargs)
+    return _RISK_CUBES[key]
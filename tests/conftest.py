@@ -0,0 +1,57 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# the modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# random values for each loan_payments column the tests use
+LOAN_COLUMNS = {
+    'int_rate': lambda rng, n: rng.normal(13, 4, n),
+    'annual_inc': lambda rng, n: rng.lognormal(10.8, 0.6, n),
+    'dti': lambda rng, n: rng.uniform(0, 40, n),
+    'funded_amount': lambda rng, n: rng.integers(1000, 35000, n).astype('float64'),
+    'delinq_2yrs': lambda rng, n: pd.array(rng.integers(0, 4, n), dtype='Int16'),
+    'term': lambda rng, n: pd.Categorical(rng.choice(['36 months', '60 months'], n)),
+    'employment_length': lambda rng, n: pd.Categorical(rng.choice(['< 1 year', '2 years', '10+ years'], n),
+                                                       categories=['10+ years', '2 years', '< 1 year']),
+    'purpose': lambda rng, n: rng.choice(['car', 'credit_card', 'debt_consolidation'], n).astype(object),
+    'loan_status': lambda rng, n: rng.choice(['Current', 'Charged Off', 'Default'], n),
+}
+
+
+@pytest.fixture
+def loans(request):
+    '''
+    Random loans. A test module sets the columns and size with a LOANS dictionary of
+    make_loans arguments, which a test can override through indirect parametrisation.
+    '''
+    options = {**getattr(request.module, 'LOANS', {}), **getattr(request, 'param', {})}
+    return make_loans(**options)
+
+
+def make_loans(columns: list[str] | None=None, n: int=1000, nulls: int=0, dtypes: dict | None=None,
+               index: np.ndarray | None=None, seed: int=0) -> pd.DataFrame:
+    '''
+    Returns n random loans with the given columns.
+
+    Parameters:
+        columns: The columns, from LOAN_COLUMNS. Default = None (all of them)
+        n: The number of loans. Default = 1000
+        nulls: The number of nulls put in each column. Default = 0
+        dtypes: Data types to convert columns to, e.g. {'int_rate': 'float32'}. Default = None
+        index: The index. Default = None (a range index)
+        seed: The random seed. Default = 0
+    '''
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: LOAN_COLUMNS[column](rng, n) for column in columns or LOAN_COLUMNS})
+    if dtypes:
+        df = df.astype(dtypes)
+    if nulls:
+        for column in df.columns:
+            df.loc[rng.choice(n, nulls, replace=False), column] = None
+    if index is not None:
+        df.index = index
+    return df
@@ -0,0 +1,34 @@
+from dataframe_info import DataFrameInfo
+import numpy as np
+import pandas as pd
+
+
+def test_profile_matches_pandas():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.normal(size=200), 'b': rng.choice(['x', 'y', 'z'], 200)})
+    df.loc[:9, 'a'] = np.nan
+    profile = DataFrameInfo().get_profile(df)
+
+    assert profile.loc['a', 'null_count'] == 10
+    assert np.isclose(profile.loc['a', 'mean'], df['a'].mean())
+    assert np.isclose(profile.loc['a', 'std'], df['a'].std())
+    assert np.isclose(profile.loc['a', 'q0.5'], df['a'].median())
+    assert profile.loc['b', 'distinct_count'] == df['b'].nunique()
+
+
+def test_profile_is_recomputed_after_in_place_change():
+    info = DataFrameInfo()
+    df = pd.DataFrame({'a': [1.0, np.nan, 3.0], 'b': [1, 2, 3]})
+    assert info.get_profile(df).loc['a', 'null_count'] == 1
+
+    df['a'] = df['a'].fillna(0)
+    assert info.get_profile(df).loc['a', 'null_count'] == 0
+
+    df.loc[0, 'b'] = 10
+    assert info.get_profile(df).loc['b', 'max'] == 10
+
+
+def test_profile_is_cached_for_unchanged_data():
+    info = DataFrameInfo()
+    df = pd.DataFrame({'a': [1.0, 2.0, 3.0]})
+    assert info.get_profile(df) is info.get_profile(df.copy())
@@ -0,0 +1,56 @@
+from dataframe_utils import DataFrameTransform, Imputer, _mode_value
+import numpy as np
+import pandas as pd
+import pytest
+
+
+LOANS = {'columns': ['int_rate', 'funded_amount', 'delinq_2yrs', 'term', 'employment_length', 'purpose'],
+         'n': 500, 'nulls': 40}
+
+
+@pytest.mark.parametrize('values', [
+    pd.Series([3, 1, 1, 3, np.nan]),
+    pd.Series(['b', 'a', None, 'a', 'b']),
+    pd.Series(pd.Categorical(['60 months', '36 months', None, '60 months', '36 months'],
+                             categories=['60 months', '36 months'])),
+    pd.Series(pd.Categorical(['y', 'x', 'x', 'y'], categories=['y', 'x', 'z'], ordered=True)),
+])
+def test_mode_value_matches_pandas_mode(values):
+    assert _mode_value(values) == values.mode()[0]
+
+
+def test_mode_value_of_all_null_categorical_is_nan():
+    assert pd.isna(_mode_value(pd.Series(pd.Categorical([None, None], categories=['a', 'b']))))
+
+
+@pytest.mark.parametrize('column', ['term', 'employment_length', 'purpose', 'delinq_2yrs'])
+def test_impute_mode_matches_fillna_mode(loans, column):
+    expected = loans[column].fillna(loans[column].mode()[0])
+    pd.testing.assert_series_equal(DataFrameTransform().impute_mode(loans, column), expected)
+
+
+def test_imputer_matches_impute_methods(loans):
+    transform = DataFrameTransform()
+    strategies = {'int_rate': 'median', 'funded_amount': 'mean', 'delinq_2yrs': 'median',
+                  'term': 'mode', 'employment_length': 'mode', 'purpose': 'mode'}
+    imputed = Imputer(strategies).fit_transform(loans)
+
+    methods = {'mean': transform.impute_mean, 'median': transform.impute_median, 'mode': transform.impute_mode}
+    for column, strategy in strategies.items():
+        pd.testing.assert_series_equal(imputed[column], methods[strategy](loans, column), check_dtype=False)
+    assert imputed.isna().sum().sum() == 0
+
+
+def test_imputer_round_trips_through_dict(loans):
+    imputer = Imputer({'int_rate': 'median', 'term': 'mode'}).fit(loans)
+    restored = Imputer.from_dict(imputer.to_dict())
+    pd.testing.assert_frame_equal(restored.transform(loans), imputer.transform(loans))
+
+
+def test_drop_outliers_with_bounds_or_columns(loans, capsys):
+    transform = DataFrameTransform()
+    bounds = transform.outlier_bounds(loans, ['int_rate', 'funded_amount'], method='iqr', threshold=1)
+    pd.testing.assert_frame_equal(transform.drop_outliers(loans, bounds=bounds),
+                                  transform.drop_outliers(loans, ['int_rate', 'funded_amount'], 'iqr', 1))
+    with pytest.raises(ValueError, match='columns or bounds'):
+        transform.drop_outliers(loans)
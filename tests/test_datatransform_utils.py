@@ -0,0 +1,26 @@
+from datatransform_utils import DataTransform
+import numpy as np
+import pandas as pd
+
+
+def test_optimize_memory_downcasts_without_loss():
+    df = pd.DataFrame({
+        'small': np.arange(100, dtype='int64'),
+        'whole': np.arange(100, dtype='float64'),
+        'with_nulls': np.r_[np.nan, np.arange(99, dtype='float64') * 1000],
+        'fraction': np.linspace(0, 1, 100),
+        'text': ['a', 'b'] * 50,
+    })
+    optimized, report = DataTransform().optimize_memory(df)
+
+    assert optimized.dtypes.astype(str).to_dict() == {
+        'small': 'int8', 'whole': 'int8', 'with_nulls': 'Int32', 'fraction': 'float64', 'text': 'category'}
+    for column in df.columns:
+        pd.testing.assert_series_equal(optimized[column].astype(df[column].dtype), df[column])
+    assert (report['bytes_after'] <= report['bytes_before']).all()
+
+
+def test_optimize_memory_keeps_floats_outside_int64_range():
+    df = pd.DataFrame({'huge': [1e20, 2e20], 'inexact': [2.0**60, 2.0**60 + 2**8]})
+    optimized, _ = DataTransform().optimize_memory(df)
+    pd.testing.assert_frame_equal(optimized, df)
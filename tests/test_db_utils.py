@@ -0,0 +1,80 @@
+from sqlalchemy import create_engine
+import db_utils
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_loans(ids, last_payment_dates):
+    return pd.DataFrame({'id': ids, 'loan_amount': np.arange(len(ids)) * 1000 + 1000,
+                         'last_payment_date': last_payment_dates})
+
+
+@pytest.fixture
+def connector(tmp_path, monkeypatch):
+    '''A connector backed by a SQLite database holding the loan_payments table.'''
+    database = f'sqlite:///{tmp_path / "loans.db"}'
+    monkeypatch.setattr(db_utils.RDSDatabaseConnector, '_RDSDatabaseConnector__create_engine',
+                        lambda self: create_engine(database))
+    loans = make_loans(list(range(1, 26)), ['Jan-2021'] * 20 + ['Feb-2021'] * 5)
+    loans.to_sql('loan_payments', create_engine(database), index=False)
+    with db_utils.RDSDatabaseConnector({}) as connector:
+        yield connector
+
+
+def test_chunks_cover_the_table(connector, tmp_path):
+    chunks = list(connector.get_loan_data_chunks(chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+
+    file_name = str(tmp_path / 'loan_payments.csv')
+    assert db_utils.save_chunks_to_csv(connector.get_loan_data_chunks(chunk_size=10), file_name) == 25
+    pd.testing.assert_frame_equal(pd.read_csv(file_name), connector.get_loan_data())
+    assert connector.get_pool_status()['connections_opened'] == 1
+
+
+def test_save_chunks_with_no_chunks_removes_the_file(tmp_path):
+    file_name = tmp_path / 'loan_payments.csv'
+    file_name.write_text('id\n1\n')
+    assert db_utils.save_chunks_to_csv(iter([]), str(file_name)) == 0
+    assert not file_name.exists()
+
+
+@pytest.mark.parametrize('empty_file', [False, True])
+def test_sync_after_empty_export_fetches_the_table(connector, tmp_path, empty_file):
+    file_name = tmp_path / 'loan_payments.csv'
+    file_name.write_text('id\n1\n')
+    db_utils.save_chunks_to_csv(iter([]), str(file_name))
+    if empty_file:
+        # e.g. an export interrupted before its first chunk
+        file_name.write_text('')
+
+    assert db_utils.sync_loan_data(connector, str(file_name)) == 25
+    pd.testing.assert_frame_equal(pd.read_csv(file_name), connector.get_loan_data())
+
+
+def test_sync_fetches_only_new_and_changed_rows(connector, tmp_path):
+    file_name = str(tmp_path / 'loan_payments.csv')
+    assert db_utils.sync_loan_data(connector, file_name) == 25
+
+    # a new loan, a payment on an old loan, and a loan the watermark does not cover
+    engine = connector._RDSDatabaseConnector__get_database_connection()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("update loan_payments set last_payment_date = 'Mar-2021', loan_amount = 1 where id = 3")
+        connection.exec_driver_sql("update loan_payments set loan_amount = 2 where id = 4")
+    make_loans([26], ['Mar-2021']).to_sql('loan_payments', engine, index=False, if_exists='append')
+
+    # the 5 rows in the watermark month (Feb-2021), id 3 and id 26
+    assert db_utils.sync_loan_data(connector, file_name) == 7
+    synced = pd.read_csv(file_name).set_index('id').sort_index()
+    assert len(synced) == 26
+    assert synced.loc[3, 'loan_amount'] == 1
+    assert synced.loc[3, 'last_payment_date'] == 'Mar-2021'
+    assert synced.loc[26, 'loan_amount'] == 1000
+    # unchanged month and id, so not fetched again
+    assert synced.loc[4, 'loan_amount'] == 4000
+
+
+def test_watermark_of_snapshot():
+    watermark = db_utils.get_watermark(make_loans([1, 7, 3], ['Jan-2021', 'Mar-2021', None]))
+    assert watermark == {'id': 7, 'last_payment_date': pd.Period('2021-03', freq='M')}
+    assert db_utils.get_watermark(pd.DataFrame()) == {'id': None, 'last_payment_date': None}
@@ -0,0 +1,86 @@
+from forecast_utils import LoanBook, project_revenue, segment_losses, term_months
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def loans():
+    rng = np.random.default_rng(0)
+    n = 3000
+    df = pd.DataFrame({
+        'loan_amount': rng.integers(1000, 35000, n).astype('float64'),
+        'int_rate': rng.uniform(5, 25, n).round(2),
+        'term': rng.choice(['36 months', '60 months'], n),
+        'issue_date': pd.PeriodIndex.from_ordinals(rng.integers(540, 630, n), freq='M'),
+        'last_payment_date': pd.Period('2022-01', freq='M'),
+        'loan_status': rng.choice(['Current', 'In Grace Period', 'Fully Paid', 'Charged Off'], n),
+    })
+    df['instalment'] = (rng.uniform(30, 1200, n)).round(2)
+    df.loc[rng.choice(n, 30, replace=False), 'term'] = None
+    df.loc[rng.choice(n, 30, replace=False), 'instalment'] = np.nan
+    return df
+
+
+def test_annuity_principal_repays_amount_borrowed():
+    book = LoanBook([10000], [7.5], [36], [600])
+    schedule = book.schedule()
+    assert len(schedule) == 36
+    assert schedule['principal'].sum() == pytest.approx(10000)
+    # the fixed annuity payment, interest first on the opening balance
+    assert schedule['payment'].iloc[:-1].to_numpy() == pytest.approx(np.full(35, 311.06), abs=0.01)
+    assert schedule['interest'].iloc[0] == pytest.approx(10000 * 0.075 / 12)
+    assert book.expected_revenue().iloc[0] == pytest.approx(schedule['payment'].sum())
+
+
+def test_schedule_does_not_depend_on_chunk_size(loans):
+    large = LoanBook.from_dataframe(loans, paid_column=None)
+    small = LoanBook.from_dataframe(loans, paid_column=None, chunk_size=7)
+    for statuses in [None, ['Current', 'In Grace Period']]:
+        pd.testing.assert_frame_equal(small.schedule(statuses=statuses), large.schedule(statuses=statuses))
+        pd.testing.assert_frame_equal(small.schedule('2022-01', 6, statuses), large.schedule('2022-01', 6, statuses))
+        pd.testing.assert_series_equal(small.expected_revenue(statuses), large.expected_revenue(statuses))
+
+
+def test_project_revenue_matches_notebook_loop(loans):
+    prediction_start_date = pd.Period('2022-01', freq='M')
+    # milestone_04: remaining instalments of the active loans, summed for each of the next six months
+    active_loans = loans[loans['loan_status'].isin(['Current', 'In Grace Period'])].copy()
+    active_loans['term'] = term_months(active_loans['term'])
+    active_loans = active_loans.dropna(subset=['term'])
+    active_loans['end_date'] = [issue + int(term) for issue, term in zip(active_loans['issue_date'], active_loans['term'])]
+    active_loans['months_left'] = (active_loans['end_date'] - prediction_start_date).apply(lambda p: p.n)
+    active_loans = active_loans[active_loans['months_left'] > 0]
+    sum_recovered_month = []
+    for period in range(1, 7):
+        loans_active = active_loans[active_loans['months_left'] >= period]
+        sum_recovered_month.append(loans_active['instalment'].sum())
+
+    projection = project_revenue(loans)
+    assert projection.index[0] == prediction_start_date + 1
+    assert projection['collected'].to_numpy() == pytest.approx(sum_recovered_month)
+    assert projection['cumulative'].to_numpy() == pytest.approx(np.cumsum(sum_recovered_month))
+
+
+def test_segment_losses_skip_unknown_expected_revenue(loans):
+    loans['total_payment'] = loans['loan_amount'] * 0.4
+    summary = segment_losses(loans, {'charged_off': ['Charged Off']})
+
+    # milestone_04: the sums skip loans with a missing term or instalment
+    charged_off = loans[loans['loan_status'] == 'Charged Off'].copy()
+    charged_off['term'] = term_months(charged_off['term'])
+    charged_off['expected_total_amount'] = charged_off['term'] * charged_off['instalment']
+    charged_off['expected_loss'] = charged_off['expected_total_amount'] - charged_off['total_payment']
+    total_expected_revenue = (term_months(loans['term']) * loans['instalment']).sum()
+
+    row = summary.loc['charged_off']
+    assert row['loans'] == len(charged_off)
+    assert row['expected_revenue'] == pytest.approx(charged_off['expected_total_amount'].sum())
+    assert row['projected_loss'] == pytest.approx(charged_off['expected_loss'].sum())
+    assert row['percentage_of_revenue'] == pytest.approx(charged_off['expected_loss'].sum() / total_expected_revenue * 100)
+    assert summary.loc['all', 'loans'] == len(loans)
+
+    # loans without a schedule are missing from LoanBook.expected_revenue and are skipped the same way
+    book = LoanBook.from_dataframe(loans)
+    summary = segment_losses(loans, {'charged_off': ['Charged Off']}, book.expected_revenue())
+    assert summary.loc['all', 'projected_loss'] == pytest.approx(book.projected_loss())
@@ -0,0 +1,38 @@
+from dataframe_utils import DataFrameTransform, Imputer
+from parallel_utils import ColumnExecutor
+import numpy as np
+import pandas as pd
+import pytest
+
+
+LOANS = {'columns': ['int_rate', 'annual_inc', 'delinq_2yrs', 'term', 'purpose'], 'n': 1000, 'nulls': 50,
+         'dtypes': {'int_rate': 'float32'}}
+
+
+def test_impute_matches_imputer(loans):
+    strategies = {'int_rate': 'median', 'annual_inc': 'mean', 'delinq_2yrs': 'mode',
+                  'term': 'mode', 'purpose': 'missing'}
+    tasks = {column: ('impute', {'strategy': strategy}) for column, strategy in strategies.items()}
+    imputed, fill_values = ColumnExecutor(max_workers=2).transform(loans, tasks)
+
+    expected = Imputer(strategies).fit_transform(loans)
+    pd.testing.assert_frame_equal(imputed, expected)
+    assert fill_values['term'] == expected['term'].mode()[0]
+
+
+def test_power_and_outliers_match_serial(loans):
+    transform = DataFrameTransform()
+    sample = loans[['annual_inc']].dropna()
+    executor = ColumnExecutor(max_workers=2)
+
+    transformed, _ = executor.transform(sample, {'annual_inc': ('power', {'method': 'yeo-johnson'})})
+    np.testing.assert_allclose(transformed['annual_inc'], transform.yeo_johnson_transform(sample, 'annual_inc'))
+
+    mask, _ = executor.outlier_mask(sample, ['annual_inc'], method='iqr')
+    expected, _ = transform.detect_outliers(sample, ['annual_inc'], method='iqr')
+    pd.testing.assert_series_equal(mask, expected, check_names=False)
+
+
+def test_numeric_task_on_text_column_raises(loans):
+    with pytest.raises(TypeError):
+        ColumnExecutor(max_workers=1).transform(loans, {'purpose': ('log', {})})
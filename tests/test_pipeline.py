@@ -0,0 +1,150 @@
+from cache_utils import StepCache
+from pipeline import CleaningPipeline
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def loans():
+    rng = np.random.default_rng(0)
+    n = 1000
+    df = pd.DataFrame({
+        'id': np.arange(n),
+        'int_rate': rng.normal(13, 4, n),
+        'annual_inc': rng.lognormal(10.8, 0.6, n),
+        'funded_amount': rng.integers(1000, 35000, n).astype('float64'),
+        'term': rng.choice(['36 months', '60 months'], n).astype(object),
+        'purpose': rng.choice(['car', 'credit_card', 'debt_consolidation'], n).astype(object),
+        'last_payment_date': rng.choice(['Jan-2022', 'Feb-2022'], n).astype(object),
+        'mostly_null': np.nan,
+    })
+    for column in ['int_rate', 'annual_inc', 'funded_amount', 'term', 'purpose', 'last_payment_date']:
+        df.loc[rng.choice(n, 40, replace=False), column] = None
+    df.loc[:19, 'mostly_null'] = 1.0
+    return df
+
+
+def pipelines():
+    '''Recorded steps in an order the optimiser reorders and fuses.'''
+    return {
+        'push_down_drop': lambda pipeline: (pipeline
+            .convert({'term': {'replace': [(' months', '')], 'type': 'float64'}})
+            .log_transform(['annual_inc', 'funded_amount'], log1p=True)
+            .drop_columns(['funded_amount', 'purpose'])),
+        'push_down_filter': lambda pipeline: (pipeline
+            .log_transform('annual_inc')
+            .convert({'term': {'replace': [(' months', '')], 'type': 'float64'}})
+            .drop_nulls(['last_payment_date'])),
+        'fuse': lambda pipeline: (pipeline
+            .impute({'int_rate': 'median'})
+            .impute({'annual_inc': 'mean', 'purpose': 'mode'})
+            .power_transform('int_rate')
+            .power_transform('annual_inc')),
+        'barrier_and_outliers': lambda pipeline: (pipeline
+            .drop_nulls_threshold(0.5)
+            .impute({'int_rate': 'median', 'annual_inc': 'median'})
+            .log_transform('annual_inc')
+            .drop_outliers(['int_rate', 'annual_inc'], method='iqr')
+            .drop_columns(['purpose'])),
+    }
+
+
+@pytest.mark.parametrize('name', pipelines())
+def test_optimised_run_matches_recorded_order(loans, name, capsys):
+    optimised = pipelines()[name](CleaningPipeline())
+    recorded = pipelines()[name](CleaningPipeline(optimize=False))
+    # the optimiser must have changed the plan for the comparison to test anything
+    assert list(map(repr, optimised.plan())) != list(map(repr, recorded.plan()))
+    pd.testing.assert_frame_equal(optimised.run(loans), recorded.run(loans))
+
+
+def test_run_leaves_input_unchanged(loans, capsys):
+    before = loans.copy()
+    pipelines()['barrier_and_outliers'](CleaningPipeline()).run(loans)
+    pd.testing.assert_frame_equal(loans, before)
+
+
+def cleaning(pipeline, outlier_threshold=1.5):
+    return (pipeline
+            .convert({'term': {'replace': [(' months', '')], 'type': 'float64'}})
+            .impute({'int_rate': 'median', 'annual_inc': 'mean', 'term': 'mode'})
+            .log_transform('annual_inc')
+            .drop_outliers(['int_rate', 'annual_inc'], method='iqr', threshold=outlier_threshold))
+
+
+def test_cache_resumes_after_changed_step(loans, tmp_path, capsys):
+    cache = StepCache(str(tmp_path))
+    first = cleaning(CleaningPipeline(cache=cache))
+    pd.testing.assert_frame_equal(first.run(loans), cleaning(CleaningPipeline()).run(loans))
+    assert not first.report['cached'].any()
+
+    # only the last step's arguments change, so the steps before it are read from the cache
+    changed = cleaning(CleaningPipeline(cache=cache), outlier_threshold=3)
+    result = changed.run(loans)
+    assert changed.report['cached'].tolist() == [True, True, True, False]
+    pd.testing.assert_frame_equal(result, cleaning(CleaningPipeline(), outlier_threshold=3).run(loans))
+    # the fitted imputer is restored with the cached result
+    assert changed.last_plan[1].fitted.fill_values == first.last_plan[1].fitted.fill_values
+
+    # a changed input misses the cache
+    rerun = cleaning(CleaningPipeline(cache=cache))
+    rerun.run(loans.iloc[1:])
+    assert not rerun.report['cached'].any()
+
+
+def test_cache_evicts_least_recently_used(loans, tmp_path):
+    cache = StepCache(str(tmp_path))
+    cache.put('old', loans)
+    cache.put('new', loans.iloc[:500])
+    size = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    os.utime(tmp_path / 'old.parquet', (0, 0))
+
+    cache.max_bytes = size - 1
+    cache.evict()
+    assert not cache.contains('old')
+    assert cache.contains('new')
+    pd.testing.assert_frame_equal(cache.get('new')[0], loans.iloc[:500])
+
+
+@pytest.mark.parametrize('build', [
+    # exact statistics: null counts, means and standard deviations
+    lambda pipeline: (pipeline
+        .drop_nulls_threshold(0.5)
+        .convert({'term': {'replace': [(' months', '')], 'type': 'float64'}})
+        .impute({'int_rate': 'mean', 'purpose': 'unknown'})
+        .drop_nulls(['last_payment_date'])
+        .log_transform('annual_inc', log1p=True)
+        .drop_outliers(['int_rate', 'annual_inc'], method='zscore', threshold=2.5)
+        .drop_columns(['funded_amount'])),
+    # steps that need no statistics
+    lambda pipeline: (pipeline
+        .convert({'term': {'replace': [(' months', '')], 'type': 'float64'}})
+        .drop_nulls(['term', 'int_rate'])
+        .log_transform('funded_amount')),
+])
+@pytest.mark.parametrize('chunksize', [37, 5000])
+def test_run_chunked_matches_run(loans, tmp_path, capsys, build, chunksize):
+    csv_file, output_file = tmp_path / 'loans.csv', tmp_path / 'cleaned.csv'
+    loans.to_csv(csv_file, index=False)
+    df = pd.read_csv(csv_file)
+
+    expected = build(CleaningPipeline()).run(df).reset_index(drop=True)
+    rows = build(CleaningPipeline()).run_chunked(str(csv_file), str(output_file), chunksize=chunksize)
+    assert rows == len(expected)
+    pd.testing.assert_frame_equal(pd.read_csv(output_file), expected, check_dtype=False)
+
+
+def test_run_chunked_median_close_to_run(loans, tmp_path, capsys):
+    csv_file, output_file = tmp_path / 'loans.csv', tmp_path / 'cleaned.csv'
+    loans.to_csv(csv_file, index=False)
+    df = pd.read_csv(csv_file)
+
+    # medians come from a quantile sketch and modes from a frequent value counter
+    chunked = CleaningPipeline().impute({'annual_inc': 'median', 'purpose': 'mode'})
+    chunked.run_chunked(str(csv_file), str(output_file), chunksize=100)
+    fill_values = chunked.last_plan[0].fitted.fill_values
+    assert fill_values['purpose'] == df['purpose'].mode()[0]
+    assert fill_values['annual_inc'] == pytest.approx(df['annual_inc'].median(), rel=0.02)
+    assert not pd.read_csv(output_file)[['annual_inc', 'purpose']].isna().any().any()
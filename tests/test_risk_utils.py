@@ -0,0 +1,61 @@
+from risk_utils import ANNUAL_INC_BINS, ANNUAL_INC_LABELS, DTI_BINS, DTI_LABELS, Binner
+import numpy as np
+import pandas as pd
+import pytest
+
+
+LOANS = {'columns': ['annual_inc', 'dti', 'loan_status'], 'n': 2000, 'index': np.arange(2000) * 3 + 7}
+
+
+@pytest.fixture
+def loans(loans):
+    # nulls, edges and values outside the bins
+    loans.iloc[:5, 0] = np.nan
+    loans.iloc[5:8, 0] = [0, 25000, 2e6]
+    loans.iloc[8, 1] = -0.001
+    return loans
+
+
+@pytest.mark.parametrize('column, edges, labels', [
+    ('annual_inc', ANNUAL_INC_BINS, ANNUAL_INC_LABELS),
+    ('dti', DTI_BINS, DTI_LABELS),
+    ('dti', DTI_BINS, None),
+])
+def test_binner_matches_cut(loans, column, edges, labels):
+    binned = Binner(edges, labels).bin(loans[column])
+    assert binned.codes.dtype == np.int8
+    pd.testing.assert_series_equal(binned.series(), pd.cut(loans[column], edges, labels=labels), check_names=False)
+
+
+def test_binner_from_quantiles_matches_qcut(loans):
+    binned = Binner.from_quantiles(loans['dti'], 5).bin(loans['dti']).series()
+    expected = pd.qcut(loans['dti'], 5)
+    np.testing.assert_array_equal(binned.cat.codes, expected.cat.codes)
+
+
+def test_subset_reuses_codes(loans):
+    income = Binner(ANNUAL_INC_BINS, ANNUAL_INC_LABELS).bin(loans['annual_inc'])
+    charged_off = loans[loans['loan_status'] == 'Charged Off']
+    expected = pd.cut(charged_off['annual_inc'], ANNUAL_INC_BINS, labels=ANNUAL_INC_LABELS)
+
+    pd.testing.assert_series_equal(income.subset(charged_off), expected, check_names=False)
+    pd.testing.assert_series_equal(income.subset(charged_off.index), expected, check_names=False)
+    mask = loans['loan_status'] == 'Charged Off'
+    pd.testing.assert_series_equal(income.subset(mask), expected, check_names=False)
+    pd.testing.assert_series_equal(income.subset(mask.to_numpy()), expected, check_names=False)
+    pd.testing.assert_series_equal(income.subset(np.flatnonzero(mask)), expected, check_names=False)
+
+
+def test_subset_mask_is_aligned_on_index(loans):
+    income = Binner(ANNUAL_INC_BINS).bin(loans['annual_inc'])
+    mask = loans['loan_status'] == 'Default'
+    shuffled = mask.sample(frac=1, random_state=0)
+    pd.testing.assert_series_equal(income.subset(shuffled), income.subset(mask))
+    with pytest.raises(ValueError):
+        income.subset(mask.iloc[:10])
+
+
+def test_subset_rejects_foreign_rows(loans):
+    income = Binner(ANNUAL_INC_BINS).bin(loans['annual_inc'])
+    with pytest.raises(ValueError):
+        income.subset(pd.Index([0, 1]))
@@ -0,0 +1,60 @@
+from dataframe_info import DataFrameInfo
+from stream_stats import DataFrameAccumulator
+import numpy as np
+import pandas as pd
+
+
+def test_stats_chunked_match_pandas(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'id': np.arange(1000), 'amount': rng.normal(100, 20, 1000),
+                       'grade': rng.choice(list('ABC'), 1000)})
+    df.loc[rng.choice(1000, 50, replace=False), 'amount'] = np.nan
+    file_name = tmp_path / 'loans.csv'
+    df.to_csv(file_name, index=False)
+
+    accumulator = DataFrameInfo().get_stats_chunked(file_name, chunksize=100)
+    stats = accumulator.get_stats()
+    expected = df.describe()
+    for statistic in ['count', 'mean', 'std', 'min', 'max']:
+        np.testing.assert_allclose(stats.loc[statistic], expected.loc[statistic, stats.columns])
+    pd.testing.assert_frame_equal(accumulator.null_counts(), DataFrameInfo().null_counts(df), check_dtype=False)
+
+
+def test_column_starting_with_nulls_is_not_numeric(tmp_path):
+    df = pd.DataFrame({'id': np.arange(20), 'note': [None] * 5 + ['text'] * 15})
+    file_name = tmp_path / 'loans.csv'
+    df.to_csv(file_name, index=False)
+
+    accumulator = DataFrameInfo().get_stats_chunked(file_name, chunksize=5)
+    assert list(accumulator.get_stats().columns) == ['id']
+    profile = accumulator.get_profile()
+    assert profile.loc['note', 'null_count'] == 5
+    assert profile.loc['note', 'mode'] == 'text'
+
+
+def test_numeric_column_turning_to_text_drops_numeric_stats():
+    accumulator = DataFrameAccumulator()
+    accumulator.update(pd.DataFrame({'x': [1.0, 2.0]}))
+    accumulator.update(pd.DataFrame({'x': ['a', 'b']}))
+    assert 'x' not in accumulator.get_stats().columns
+    assert accumulator.columns['x'].rows == 4
+
+
+def test_distinct_count_ignores_int_and_float_chunks():
+    ids = pd.DataFrame({'id': np.arange(1000)})
+    accumulator = DataFrameAccumulator()
+    # every id is read once in an int64 chunk and once in a float64 chunk with a null
+    accumulator.update(ids)
+    accumulator.update(pd.concat([ids, pd.DataFrame({'id': [np.nan]})]))
+    assert ids['id'].dtype == 'int64'
+    assert abs(accumulator.get_profile().loc['id', 'distinct_count'] - 1000) <= 10
+
+
+def test_merge_does_not_share_state():
+    first, second = DataFrameAccumulator(), DataFrameAccumulator()
+    second.update(pd.DataFrame({'x': [1.0]}))
+    first.merge(second)
+    first.update(pd.DataFrame({'x': [2.0]}))
+    assert second.columns['x'].rows == 1
+    assert first.columns['x'].rows == 2
+    assert first.columns['x'].moments.mean == 1.5